@@ -1,6 +1,8 @@
 import random
 from settings import *
 
+DROP_SCATTER = 90  # Max speed in pixels per second that dropped items fly out at
+
 class Object(pygame.sprite.Sprite): # Inherits from pygame.sprite.Sprite
     def __init__(self, x, y, image):
         super().__init__()
@@ -10,11 +12,33 @@ class Object(pygame.sprite.Sprite): # Inherits from pygame.sprite.Sprite
 
 
 
+class ItemStack:
+    # Inventory record for picked-up items, separate from the world sprite
+    __slots__ = ("name", "kind", "count", "image", "aspects", "price")
+
+    def __init__(self, name, kind, image, count=1, aspects=(), price=0):
+        self.name = name
+        self.kind = kind # Item class the stack came from, used to spawn it back into the world
+        self.count = count
+        self.image = image
+        self.aspects = tuple(aspects)
+        self.price = price
+
+    def draw(self, screen, x, y): # Used by inventory and hotbar slots
+        screen.blit(self.image, (x, y))
+
+
 class Item(Object):
     def __init__(self, x, y, image, name):
         super().__init__(x, y, image)
         self.name = name
 
+    def to_stack(self):
+        return ItemStack(self.name, type(self), self.image)
+
+    def draw(self, screen, x, y): # Used by inventory and hotbar slots
+        screen.blit(self.image, (x, y))
+
 
 class CrystalPile(Object):
     def __init__(self, x, y, images, planted_object_type, growth_speed, product_quantity, max_growth=3):
@@ -25,36 +49,58 @@ class CrystalPile(Object):
         self.growth_stage = 0
         self.max_growth = max_growth
         self.images = images # List of images for growth stages
+        self.farm = None # CrystalFarm that grows this pile, if any
 
-    def next_day(self):
-        self.growth_stage += self.growth_speed
-        self.growth_stage = min(self.growth_stage, self.max_growth) #Clamp growth stage
-        self.image = self.images[self.growth_stage]
-        self.rect = self.image.get_rect(topleft=(self.x, self.y))
-
-    def harvest(self, all_sprites, crystal_group):
-        harvested_crystals = []
-        for _ in range(self.product_quantity):
-            #Create a crystal.  You'll need to define how crystals are created.
-            new_crystal = self.planted_object_type(self.rect.centerx, self.rect.centery,  #Position near the pile
-                                                    pygame.image.load("crystal.png"), #Replace with your crystal image
-                                                    aspects=["aspect1", "aspect2"]) #Example aspects
-
-            all_sprites.add(new_crystal)
-            crystal_group.add(new_crystal)
-            harvested_crystals.append(new_crystal)
+    def set_stage(self, stage):
+        self.growth_stage = stage
+        self.image = self.images[stage]
+        self.rect = self.image.get_rect(topleft=self.rect.topleft)
 
+    def next_day(self):
+        # Single-pile fallback; piles registered with a CrystalFarm are grown in bulk instead
+        self.set_stage(int(min(self.growth_stage + self.growth_speed, self.max_growth))) #Clamp growth stage
+
+    def crystal_stack(self, count):
+        # The pile's product as one inventory/world stack
+        return self.planted_object_type.make_stack(loadim("crystal.png"), count, #Cached, shared by every crystal
+                                                   ["aspect1", "aspect2"]) #Example aspects
+
+    def harvest(self, world_items):
+        # Drops the whole product around the pile in one spawn
+        indices = world_items.spawn_stack(self.crystal_stack(self.product_quantity),
+                                          self.rect.centerx, self.rect.centery, scatter=DROP_SCATTER)
+        self.remove_from_world()
+        return indices
+
+    def harvest_into(self, container, world_items):
+        # Whole pile straight into an inventory or chest as one stack; only what doesn't fit is dropped
+        left = container.add(self.crystal_stack(self.product_quantity))
+        if left:
+            world_items.spawn_stack(self.crystal_stack(left), self.rect.centerx, self.rect.centery,
+                                    scatter=DROP_SCATTER)
+        self.remove_from_world()
+        return left
+
+    def remove_from_world(self):
+        if self.farm:
+            self.farm.remove(self)
         self.kill() #Remove from sprite groups
-        return harvested_crystals
 
 
 class Crystal(Item):
     def __init__(self, x, y, image, aspects=None, price_per_aspect=25):
-        super().__init__(x, y, image)
-        self.name = "Crystal"
+        super().__init__(x, y, image, "Crystal")
         self.aspects = aspects or [] # Handle case where aspects is None
         self.price = len(self.aspects) * price_per_aspect
 
+    def to_stack(self):
+        return ItemStack(self.name, type(self), self.image, aspects=self.aspects, price=self.price)
+
+    @classmethod
+    def make_stack(cls, image, count=1, aspects=(), price_per_aspect=25):
+        # A stack of crystals without creating the sprite
+        return ItemStack("Crystal", cls, image, count, aspects, len(aspects) * price_per_aspect)
+
 class Entrance(Object):
     def __init__(self, x, y, image, scene): # scene instead of cave
         super().__init__(x, y, image)
@@ -65,21 +111,24 @@ class Entrance(Object):
         entrance_coords = self.scene.get_entrance_coords()
         player.rect.topleft = entrance_coords
 
-class Cobblestone(Object):
-    def __init__(self, x, y, image, loot_table):
-        super().__init__(x, y, image)
-        self.loot_table = loot_table
-
-    def destroy(self, all_sprites, crystal_group): # Needs sprite groups
-        if random.random() < 0.05:
-            loot_level = random.randint(1, 60)
-            for (min_level, max_level), (crystal_type, quantity) in self.loot_table.items():
-                if min_level <= loot_level <= max_level:
-                    for _ in range(quantity):
-                        #Create and add the crystal to the game world
-                        new_crystal = crystal_type(self.rect.centerx, self.rect.centery,
-                                                   pygame.image.load("crystal.png"), #Replace with image
-                                                   aspects=["aspect1", "aspect2"])
-                        all_sprites.add(new_crystal)
-                        crystal_group.add(new_crystal)
-        self.kill()
\ No newline at end of file
+# Cobblestones are plain tiles; these drop their loot into the WorldItems store
+
+def spawn_drops(drops, x, y, world_items):
+    for crystal_type, quantity, aspects in drops:
+        #Create and add the crystals to the game world, one store row each, no sprites
+        stack = crystal_type.make_stack(loadim("crystal.png"), quantity, aspects) #Cached, shared by every crystal
+        world_items.spawn_stack(stack, x, y, DROP_SCATTER)
+
+
+def destroy_cobblestone(loot_table, x, y, world_items, rng=random):
+    # rng for reproducible drops
+    spawn_drops(loot_table.roll(rng), x, y, world_items)
+
+
+def destroy_cobblestones(loot_table, positions, world_items, rng):
+    # Area mining / explosives: one batched roll for every block instead of one roll per block.
+    # positions are pixel (x, y) drop points; rng is a numpy Generator.
+    rolled = loot_table.roll_many(len(positions), rng)
+    for (x, y), index in zip(positions, rolled.tolist()):
+        if index >= 0:
+            spawn_drops(loot_table.drops[index], x, y, world_items)
@@ -0,0 +1,75 @@
+import pygame
+
+from settings import assets
+
+
+class SpriteSheet:
+    # A spritesheet sliced once into frames[row][column], rows being directions and columns
+    # animation frames. Flipped or scaled variants are made here too, never per draw.
+    def __init__(self, surface, frame_size, flip=False, scale=None):
+        self.frame_size = tuple(frame_size)
+        self.size = tuple(scale) if scale else self.frame_size
+        width, height = self.frame_size
+        columns = surface.get_width() // width
+        rows = surface.get_height() // height
+        self.frames = []
+        for row in range(rows):
+            frames = []
+            for column in range(columns):
+                frame = surface.subsurface(pygame.Rect(column * width, row * height, width, height))
+                if flip:
+                    frame = pygame.transform.flip(frame, True, False)
+                if scale:
+                    frame = pygame.transform.scale(frame, self.size)
+                frames.append(frame)
+            self.frames.append(frames)
+        self.columns = columns
+
+    def frame(self, row, column):
+        return self.frames[row][column]
+
+    def require(self, columns, name="sheet"):
+        # Clips may name columns the sheet doesn't have (yet); those show the row's first frame
+        if columns <= self.columns:
+            return
+        print(f"Warning: {name} has {self.columns} frame columns, animations use {columns}")
+        for frames in self.frames:
+            frames.extend([frames[0]] * (columns - len(frames)))
+        self.columns = columns
+
+
+sheets = {}  # (name, frame size, flip, scale) -> SpriteSheet
+
+
+def load_sheet(name, frame_size, flip=False, scale=None):
+    # Every entity using the same sheet shares one sliced table
+    key = (name, tuple(frame_size), flip, tuple(scale) if scale else None)
+    sheet = sheets.get(key)
+    if sheet is None:
+        sheet = sheets[key] = SpriteSheet(assets.get(name), frame_size, flip, scale)
+    return sheet
+
+
+class Clip:
+    # An animation compiled once from (column, ticks) pairs. ends[i] is the time in seconds
+    # at which frame i ends, and table maps each tick of the loop to its frame index, so
+    # entities that only need the picture can look it up from their clock.
+    def __init__(self, frames, fps=60):
+        self.columns = [column for column, ticks in frames]
+        self.fps = fps
+        self.table = []
+        self.ends = []
+        for index, (column, ticks) in enumerate(frames):
+            self.table.extend([index] * ticks)
+            self.ends.append(len(self.table) / fps)
+        self.length = len(self.table)
+        self.duration = self.length / fps
+
+    def __len__(self):
+        return len(self.columns)
+
+    def index_at(self, time):
+        return self.table[int(time * self.fps) % self.length]
+
+    def column_at(self, time):
+        return self.columns[self.index_at(time)]
@@ -0,0 +1,132 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+
+class AssetBatch:
+    # Progress of one stream() request; finished once every image in it is converted
+    def __init__(self, manager, keys):
+        self.manager = manager
+        self.keys = keys
+
+    def loaded(self):
+        return sum(1 for key in self.keys if key in self.manager.surfaces)
+
+    def progress(self):
+        return self.loaded() / len(self.keys) if self.keys else 1.0
+
+    def finished(self):
+        return self.loaded() == len(self.keys)
+
+
+class AssetManager:
+    # Decodes each image once and hands out the same converted surface on every request.
+    # stream() decodes on a worker pool instead; poll() converts the results on the main
+    # thread, where the display lives.
+    def __init__(self, root="images", workers=4):
+        self.root = root
+        self.surfaces = {}  # normalized path -> converted surface
+        self.scaled_surfaces = {}  # (path, size) -> scaled copy
+        self.missing = set()
+        self._placeholder = None
+        self.workers = workers
+        self.executor = None  # Started by the first stream()
+        self.decoding = {}  # normalized path -> Future of the decoded, unconverted surface
+
+    def key(self, name):
+        return os.path.normpath(name)
+
+    @property
+    def placeholder(self):
+        # One shared magenta/black checker for every missing file
+        if self._placeholder is None:
+            surface = pygame.Surface((32, 32))
+            surface.fill((255, 0, 255))
+            surface.fill((0, 0, 0), pygame.Rect(0, 0, 16, 16))
+            surface.fill((0, 0, 0), pygame.Rect(16, 16, 16, 16))
+            self._placeholder = surface
+        return self._placeholder
+
+    def get(self, name):
+        key = self.key(name)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.load(key)
+        return surface
+
+    def decode(self, key):
+        # Safe on a worker thread: no display access
+        return pygame.image.load(os.path.join(self.root, key))
+
+    def load(self, key):
+        future = self.decoding.pop(key, None)  # Already streaming: wait for it rather than decode twice
+        try:
+            surface = future.result() if future is not None else self.decode(key)
+        except (pygame.error, FileNotFoundError) as e:
+            if key not in self.missing:
+                print(f"Error loading image {key}: {e}")
+            self.missing.add(key)
+            surface = self.placeholder
+        else:
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert_alpha() # convert_alpha for transparency
+        self.surfaces[key] = surface
+        return surface
+
+    def scaled(self, name, size):
+        key = (self.key(name), tuple(size))
+        surface = self.scaled_surfaces.get(key)
+        if surface is None:
+            surface = pygame.transform.scale(self.get(name), size)
+            self.scaled_surfaces[key] = surface
+        return surface
+
+    def name_of(self, surface):
+        # Reverse lookup for save files; None for the placeholder and surfaces not from the cache
+        if surface is self._placeholder:
+            return None
+        for key, cached in self.surfaces.items():
+            if cached is surface:
+                return key
+        return None
+
+    def is_missing(self, name):
+        return self.key(name) in self.missing
+
+    def preload(self, manifest):
+        # Call once after pygame.display.set_mode so surfaces get converted
+        for name in manifest:
+            self.get(name)
+
+    def stream(self, manifest):
+        # Queues every image not cached yet for decoding in the background and returns
+        # immediately; the batch reports progress as poll() finishes them
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="assets")
+        keys = []
+        for name in manifest:
+            key = self.key(name)
+            if key not in keys:
+                keys.append(key)
+            if key not in self.surfaces and key not in self.decoding:
+                self.decoding[key] = self.executor.submit(self.decode, key)
+        return AssetBatch(self, keys)
+
+    def poll(self, budget=0.002):
+        # Main thread: converts finished decodes until budget seconds are spent
+        start = time.perf_counter()
+        for key in [key for key, future in self.decoding.items() if future.done()]:
+            self.load(key)
+            if time.perf_counter() - start >= budget:
+                break
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def clear(self):
+        self.surfaces.clear()
+        self.scaled_surfaces.clear()
+        self.missing.clear()
@@ -0,0 +1,90 @@
+import os
+
+import pygame
+
+
+class TextureAtlas:
+    # One large surface holding many images, addressed by name
+    def __init__(self, width, height):
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.regions = {}  # name -> pygame.Rect inside self.surface
+
+    def region(self, name):
+        return self.surface.subsurface(self.regions[name])
+
+
+def pack_atlases(images, max_size=2048, padding=1):
+    # Shelf packing: tallest images first, filled left to right in rows.
+    # Images that do not fit in the current atlas open a new one.
+    order = sorted(images.items(), key=lambda item: (-item[1].get_height(), -item[1].get_width()))
+    layouts = []
+    placements = {}
+    x = y = shelf_height = 0
+    for name, image in order:
+        width, height = image.get_size()
+        if width > max_size or height > max_size:
+            continue  # Too big to share an atlas, stays a standalone surface
+        if x + width > max_size:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        if not layouts or y + height > max_size:
+            layouts.append([])
+            x = y = shelf_height = 0
+        placements[name] = (len(layouts) - 1, pygame.Rect(x, y, width, height))
+        layouts[-1].append(name)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+
+    atlases = []
+    for names in layouts:
+        rects = [placements[name][1] for name in names]
+        atlas = TextureAtlas(max(rect.right for rect in rects), max(rect.bottom for rect in rects))
+        for name, rect in zip(names, rects):
+            atlas.surface.blit(images[name], rect)
+            atlas.regions[name] = rect
+        atlases.append(atlas)
+    return atlases
+
+
+def atlas_sources(assets, directory, extra=()):
+    # Image names under assets.root/directory plus any extra sheet names
+    names = list(extra)
+    for root, _, files in os.walk(os.path.join(assets.root, directory)):
+        for file in sorted(files):
+            if file.lower().endswith((".png", ".jpg")):
+                names.append(os.path.relpath(os.path.join(root, file), assets.root))
+    return names
+
+
+def build_atlases(assets, names, max_size=2048):
+    # Pack the named images and make the asset manager hand out atlas subsurfaces for them
+    images = {assets.key(name): assets.get(name) for name in names if not assets.is_missing(name)}
+    atlases = pack_atlases(images, max_size)
+    for atlas in atlases:
+        if pygame.display.get_surface() is not None:
+            atlas.surface = atlas.surface.convert_alpha()
+        for name in atlas.regions:
+            assets.surfaces[name] = atlas.region(name)
+    assets.scaled_surfaces.clear()
+    return atlases
+
+
+class SpriteBatch:
+    # Collects a frame's blits and submits them with one Surface.blits call per source atlas.
+    # Subsurfaces (atlas regions) are resolved to their parent surface plus an area rect.
+    def __init__(self):
+        self.batches = {}  # source surface -> [(source, dest, area), ...]
+
+    def add(self, image, dest):
+        parent = image.get_parent()
+        if parent is None:
+            self.batches.setdefault(image, []).append((image, dest))
+        else:
+            area = pygame.Rect(image.get_offset(), image.get_size())
+            self.batches.setdefault(parent, []).append((parent, dest, area))
+
+    def flush(self, screen):
+        for blits in self.batches.values():
+            screen.blits(blits, doreturn=False)
+        self.batches.clear()
@@ -0,0 +1,261 @@
+# Headless benchmark: builds the real scenes on SDL's dummy video driver, replays
+# scripted input and reports frame time percentiles, garbage collections per frame and,
+# with --trace-alloc, the memory blocks allocated per frame.
+#
+#   python bench.py --scene cave --map-size 512 --crystals 5000 --frames 600
+#   python bench.py --scene menu --script recorded_input.json
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Asset paths are relative to the repo root
+
+import pygame
+
+
+# Key names usable in scripts, mapped to pygame key codes
+KEY_NAMES = {
+    "w": pygame.K_w, "a": pygame.K_a, "s": pygame.K_s, "d": pygame.K_d, "e": pygame.K_e,
+    "lshift": pygame.K_LSHIFT, "rshift": pygame.K_RSHIFT,
+}
+
+# Runs along a loop three screens wide, walking its short sides, and scrolls the hotbar
+# now and then. The cave bench starts the player mid-map at the loop's top left corner and
+# carves the loop into the floor, so the walk scrolls the camera, streams chunks in and out
+# and re-renders chunk layers instead of bumping into the first wall.
+TRACK = (2400, 800)  # Loop size in pixels: 400 running ticks across, 267 walking ticks down
+TRACK_TILES = 5  # Width of the carved path in tiles, room for the player sprite
+DEFAULT_SCRIPT = {
+    "steps": [[400, ["d", "lshift"]], [267, ["s"]], [400, ["a", "lshift"]], [267, ["w"]], [30, []]],
+    "events": [[45, "MOUSEWHEEL", {"x": 0, "y": 1}], [150, "MOUSEWHEEL", {"x": 0, "y": -1}],
+               [20, "MOUSEMOTION", {"pos": [350, 420], "rel": [0, 0], "buttons": [0, 0, 0]}],
+               [90, "MOUSEMOTION", {"pos": [10, 10], "rel": [0, 0], "buttons": [0, 0, 0]}]],
+}
+
+
+class KeyState:
+    # Stand-in for pygame.key.get_pressed(): indexable by key code
+    def __init__(self, pressed):
+        self.pressed = pressed
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class InputScript:
+    # Loops over held-key steps ([ticks, [key names]]) and fires one-off events at given ticks
+    def __init__(self, steps, events=()):
+        self.steps = [(ticks, KeyState({KEY_NAMES[name] for name in names})) for ticks, names in steps]
+        self.length = sum(ticks for ticks, _ in self.steps) or 1
+        self.events = {}
+        for tick, event_type, attributes in events:
+            self.events.setdefault(tick % self.length, []).append(
+                pygame.event.Event(getattr(pygame, event_type), attributes))
+        self.tick = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(data["steps"], data.get("events", ()))
+
+    def keys(self):
+        tick = self.tick % self.length
+        for ticks, state in self.steps:
+            if tick < ticks:
+                return state
+            tick -= ticks
+        return KeyState(set())
+
+    def frame_events(self):
+        return self.events.get(self.tick % self.length, [])
+
+    def advance(self):
+        self.tick += 1
+
+
+def build_world(args):
+    from settings import ASSET_MANIFEST, ATLAS_DIRECTORY, ATLAS_SHEETS, assets, loadim
+    from atlas import atlas_sources, build_atlases
+    from scene import SceneManager
+    from menu import MenuScene
+    from cart import CaveScene
+    from Object import Crystal, ItemStack
+
+    pygame.init()
+    screen = pygame.display.set_mode((args.width, args.height))
+    assets.preload(ASSET_MANIFEST)
+    build_atlases(assets, atlas_sources(assets, ATLAS_DIRECTORY, ATLAS_SHEETS))
+
+    scene_manager = SceneManager(screen)
+    tile_images = {"grass": loadim("Map/rамень.png"), "plantable": loadim("Map/земля.png"),
+                   "wall": loadim("Map/rамень.png")}
+    scene_manager.add_scene("menu", MenuScene(scene_manager))
+    cave = CaveScene(screen, scene_manager, tile_images=tile_images,
+                     map_size=(args.map_size, args.map_size), cobblestone_density=args.cobblestones,
+                     world_seed=args.seed)
+    scene_manager.add_scene("cave", cave)
+    scene_manager.set_scene(args.scene)
+
+    if args.scene == "cave":
+        # Levels are built on worker threads; measure the running level, not its generation
+        while cave.level is None:
+            scene_manager.update(0)
+            time.sleep(0.001)
+        world_pixels = args.map_size * cave.tile_size
+        x = max((world_pixels - TRACK[0]) // 2, 0)
+        y = max((world_pixels - TRACK[1]) // 2, 0)
+        carve_track(cave, x, y)
+        scene_manager.player.place(x + cave.tile_size, y + cave.tile_size)
+        rng = random.Random(args.seed)
+        crystal_image = loadim("crystal.png")
+        world_items = scene_manager.world_items
+        crystal_type = world_items.stack_type(Crystal.make_stack(crystal_image, aspects=("aspect1", "aspect2")))
+        world_items.spawn_many(crystal_type, [rng.randrange(world_pixels) for _ in range(args.crystals)],
+                               [rng.randrange(world_pixels) for _ in range(args.crystals)])
+        inventory = scene_manager.player.inventory
+        for i in range(min(args.inventory, inventory.rows * inventory.cols)):
+            inventory.add_item(ItemStack(f"item{i}", Crystal, crystal_image))
+    return screen, scene_manager
+
+
+def carve_track(cave, x, y):
+    # Floor along the TRACK loop with its top left corner at pixel (x, y)
+    tile_size = cave.tile_size
+    x0, y0 = x // tile_size, y // tile_size
+    x1, y1 = (x + TRACK[0]) // tile_size, (y + TRACK[1]) // tile_size
+    cells = set()
+    for offset in range(TRACK_TILES):
+        cells.update((tx, y0 + offset) for tx in range(x0, x1 + TRACK_TILES))
+        cells.update((tx, y1 + offset) for tx in range(x0, x1 + TRACK_TILES))
+        cells.update((x0 + offset, ty) for ty in range(y0, y1 + TRACK_TILES))
+        cells.update((x1 + offset, ty) for ty in range(y0, y1 + TRACK_TILES))
+    for tx, ty in sorted(cells):
+        if cave.map_data.in_bounds(tx, ty):
+            cave.level.set_tile(tx, ty, cave.floor_tile)
+    cave.chunk_layers.clear()
+
+
+def gc_collections():
+    return sum(stats["collections"] for stats in gc.get_stats())
+
+
+def allocation_snapshot():
+    # The snapshots themselves are allocated by tracemalloc and this file; leave them out
+    snapshot = tracemalloc.take_snapshot()
+    return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                   tracemalloc.Filter(False, __file__)])
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run(args):
+    random.seed(args.seed)
+    screen, scene_manager = build_world(args)
+    script = InputScript.load(args.script) if args.script else InputScript(**DEFAULT_SCRIPT)
+    if scene_manager.player:
+        scene_manager.player.key_source = script.keys
+    step = 1 / 60
+
+    if args.trace_alloc:
+        tracemalloc.start()
+        snapshot = allocation_snapshot()
+    frame_times = []
+    block_deltas = []  # Live blocks at frame end minus frame start; allocations freed within the frame cancel out
+    collections = []  # Garbage collections run during the frame, all generations
+    new_blocks = []  # Blocks allocated during the frame and still alive, counted per source line
+    peaks = []  # Traced memory peak above the frame's starting level, which does include those
+    for frame in range(args.warmup + args.frames):
+        blocks_before = sys.getallocatedblocks()
+        collections_before = gc_collections()
+        if args.trace_alloc:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+
+        pygame.event.pump()
+        for event in script.frame_events():
+            scene_manager.handle_input(event)
+        scene_manager.update(step)
+        dirty_rects = scene_manager.draw()
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        script.advance()
+
+        elapsed = time.perf_counter() - start
+        if frame >= args.warmup:
+            frame_times.append(elapsed)
+            block_deltas.append(sys.getallocatedblocks() - blocks_before)
+            collections.append(gc_collections() - collections_before)
+            if args.trace_alloc:
+                peaks.append(tracemalloc.get_traced_memory()[1] - traced_before)
+        if args.trace_alloc:
+            # Per line, so blocks one line allocates aren't cancelled by blocks freed elsewhere
+            current = allocation_snapshot()
+            if frame >= args.warmup:
+                new_blocks.append(sum(stat.count_diff for stat in current.compare_to(snapshot, "lineno")
+                                      if stat.count_diff > 0))
+            snapshot = current
+    if args.trace_alloc:
+        tracemalloc.stop()
+    scene_manager.shutdown(save=False)  # Never overwrite the player's save
+    pygame.quit()
+
+    ordered = sorted(frame_times)
+    report = {
+        "scene": args.scene,
+        "map_size": args.map_size,
+        "crystals": args.crystals,
+        "frames": len(frame_times),
+        "fps": len(frame_times) / sum(frame_times),
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "live_block_growth_per_frame": statistics.mean(block_deltas),
+        "gc_collections_per_frame": statistics.fmean(collections),
+    }
+    if args.trace_alloc:
+        report["new_blocks_per_frame"] = statistics.fmean(new_blocks)
+        report["transient_peak_kib_per_frame"] = statistics.mean(peaks) / 1024
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Salt Mine frame-time benchmark")
+    parser.add_argument("--scene", choices=["menu", "cave"], default="cave")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--map-size", type=int, default=256, help="cave width and height in tiles")
+    parser.add_argument("--cobblestones", type=float, default=0.07, help="share of floor tiles that are cobblestone")
+    parser.add_argument("--crystals", type=int, default=0, help="crystals scattered on the cave floor")
+    parser.add_argument("--inventory", type=int, default=0, help="inventory slots to fill")
+    parser.add_argument("--script", help="JSON input script with 'steps' and optional 'events'")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=800)
+    parser.add_argument("--trace-alloc", action="store_true", help="also report blocks allocated and memory used within each frame, via tracemalloc snapshots (slow)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:>28}: {value:.2f}" if isinstance(value, float) else f"{key:>28}: {value}")
+
+
+if __name__ == "__main__":
+    main()
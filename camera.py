@@ -0,0 +1,44 @@
+import pygame
+
+
+class Camera:
+    # Viewport into a world larger than the screen, centred on a target rect
+    def __init__(self, width, height, world_width, world_height):
+        self.view = pygame.Rect(0, 0, width, height)
+        self.world_width = world_width
+        self.world_height = world_height
+
+    def set_world_size(self, world_width, world_height):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.clamp()
+
+    def follow(self, target_rect):
+        self.view.center = target_rect.center
+        self.clamp()
+
+    def clamp(self):
+        # Keep the view inside the world; small worlds stay pinned to the top-left
+        self.view.x = max(0, min(self.view.x, self.world_width - self.view.width))
+        self.view.y = max(0, min(self.view.y, self.world_height - self.view.height))
+
+    @property
+    def offset(self):
+        return (-self.view.x, -self.view.y)
+
+    def apply(self, rect):
+        return rect.move(-self.view.x, -self.view.y)
+
+    def to_world(self, pos):
+        return (pos[0] + self.view.x, pos[1] + self.view.y)
+
+    def visible(self, rect):
+        return self.view.colliderect(rect)
+
+    def visible_tiles(self, tile_size, margin=0):
+        # Tile rectangle (x0, y0, x1, y1) covered by the view, exclusive ends
+        x0 = self.view.left // tile_size - margin
+        y0 = self.view.top // tile_size - margin
+        x1 = (self.view.right + tile_size - 1) // tile_size + margin
+        y1 = (self.view.bottom + tile_size - 1) // tile_size + margin
+        return x0, y0, x1, y1
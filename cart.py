@@ -1,97 +1,366 @@
 import pygame
 import random
 
-from Object import Cobblestone
+import numpy as np
+
+from Object import Crystal, destroy_cobblestone, destroy_cobblestones
+from atlas import SpriteBatch
+from render import RenderPipeline
+from camera import Camera
+from cavegen import chunked_grid, fill_chunked, generate_cavern
+from collision import PassabilityMap
+from entities import WorldItems
+from levels import Level, LevelDiff, LevelStore
+from loot import compile_loot_table
+from navigation import NavGrid
+from tilemap import ChunkedTileMap, TileRegistry
+
+
+# What a mined cobblestone tile can drop: {(min_level, max_level): (crystal_type, quantity[, aspects])}
+COBBLESTONE_LOOT = {(1, 60): (Crystal, 1), (30, 60): (Crystal, 1, ("aspect1", "aspect2", "aspect3"))}
 
 
 class CaveScene(pygame.sprite.Sprite):
-    def __init__(self, screen, scene_manager, tile_size=32, tile_images=None, num_levels=60):
+    def __init__(self, screen, scene_manager, tile_size=32, tile_images=None, num_levels=60,
+                 map_size=(20, 15), chunk_size=32, cobblestone_density=0.07, max_levels=5, workers=2,
+                 world_seed=None, cavern_from_level=2, cobblestone_loot=COBBLESTONE_LOOT):
         super().__init__()
         self.screen = screen
         self.scene_manager = scene_manager
         self.tile_size = tile_size
         self.tile_images = tile_images or {}
+        self.tiles = TileRegistry(self.tile_images)  # Tile name <-> integer ID <-> image
         self.num_levels = num_levels
+        # Every level is a pure function of (world_seed, level, chunk), only player changes are stored
+        self.world_seed = random.randrange(2 ** 32) if world_seed is None else world_seed
         self.current_level = 1
-        self.unusable_tile = "wall"
-        self.map_data = []
+        self.map_size = map_size  # Level size in tiles
+        self.cavern_from_level = cavern_from_level  # Shallower levels are plain rooms, deeper ones natural caverns
+        self.chunk_size = chunk_size
+        self.cobblestone_density = cobblestone_density  # Share of floor cells turned into cobblestone
+        self.unusable_tile = self.tiles.id("wall")
+        self.floor_tile = self.tiles.id("grass")
+        self.cobblestone_tile = self.tiles.id("cobblestone")
+        self.level = None
+        self.map_data = None  # Tile map of the current level, None until its first level is built
+        self.target_level = 1  # Level being switched to once its worker finishes
+        self.spawn = None  # Where the player appears on the next level entry instead of the entrance
+        self.levels = LevelStore(self.build_level, max_levels, workers)
+        self.chunk_layers = {}  # (cx, cy) -> pre-rendered chunk surface, only kept near the camera
+        self.missing_tiles = set()
+        self.sprite_batch = SpriteBatch()
+        self.visible_sprites = []
+        self.changed_tiles = []  # World rects of tiles changed since the last frame
+        self.last_view = None
+        self.camera = Camera(screen.get_width(), screen.get_height(),
+                             map_size[0] * tile_size, map_size[1] * tile_size)
         self.player = None
         self.all_sprites = scene_manager.all_sprites  # Access SceneManager's sprite group
-        self.crystal_group = scene_manager.crystal_group # Access SceneManager's crystal group
-        self.generate_level()
-
-    def generate_level(self):
-        # Adjust dimensions as needed
-        width = 20
-        height = 15
-        # Generate the map data for this level. Replace with your room generation logic.
-        self.map_data = [["grass"] * width for _ in range(height)]  # Initial grass floor
-        self.generate_walls()
-        self.generate_cobblestones(20)  # Generate 20 cobblestones.
-
-    def generate_walls(self):
-        width = len(self.map_data[0])
-        height = len(self.map_data)
-        for x in range(width):
-            self.map_data[0][x] = self.unusable_tile
-            self.map_data[height - 1][x] = self.unusable_tile
-        for y in range(height):
-            self.map_data[y][0] = self.unusable_tile
-            self.map_data[y][width - 1] = self.unusable_tile
-
-    def generate_cobblestones(self, num_cobblestones):
-        width = len(self.map_data[0])
-        height = len(self.map_data)
+        self.world_items = WorldItems() # Dropped crystals on the current level, stored as arrays rather than sprites
+        self.cobblestone_loot = compile_loot_table(cobblestone_loot) # Cobblestones are tiles, mining rolls this
+        self.levels.request(self.current_level)
+
+    def rng(self, level, *key):
+        # Independent generator per (world seed, level, key); string seeds hash the same in every run
+        return random.Random(":".join(map(str, (self.world_seed, level, *key))))
+
+    def build_level(self, number, diff=None):
+        # Runs on a LevelStore worker thread: builds tile data only, no surfaces
+        width, height = self.map_size
+        if diff is None:
+            diff = LevelDiff(width)
+        if number >= self.cavern_from_level:
+            # Caverns come out of one whole-level automaton pass, so they are kept whole
+            map_data = ChunkedTileMap(width, height, self.chunk_size, self.floor_tile)
+            fill_chunked(map_data, self.generate_cavern(number))
+            diff.apply(map_data)  # Replay what the player mined and placed
+            return Level(number, map_data, diff, PassabilityMap(chunked_grid(map_data), self.tiles.solid))
+        # Rooms are generated chunk by chunk near the player and unloaded again behind them.
+        # Chunks not generated yet count as wall until then.
+        map_data = ChunkedTileMap(width, height, self.chunk_size, self.floor_tile,
+                                  lambda chunk, cx, cy: self.generate_chunk(number, chunk, cx, cy))
+        level = Level(number, map_data, diff,
+                      PassabilityMap(chunked_grid(map_data, self.unusable_tile), self.tiles.solid))
+        map_data.on_load = level.chunk_loaded  # Replays the player's edits and updates collision
+        map_data.generate_area(*self.chunk_area(*(self.spawn or self.get_entrance_coords())))
+        return level
+
+    def chunk_area(self, x, y, margin=1):
+        # Tile rectangle the screen covers around pixel (x, y), plus margin chunks on every side
+        pad = margin * self.chunk_size
+        half_x = self.camera.view.width // (2 * self.tile_size) + 1 + pad
+        half_y = self.camera.view.height // (2 * self.tile_size) + 1 + pad
+        tile_x = int(x) // self.tile_size
+        tile_y = int(y) // self.tile_size
+        return tile_x - half_x, tile_y - half_y, tile_x + half_x + 1, tile_y + half_y + 1
+
+    def stream_chunks(self):
+        # Generate the chunks one ring past the screen, unload those two rings out
+        if self.player is None or self.map_data is None:
+            return
+        center = self.player.rect.center
+        self.map_data.generate_area(*self.chunk_area(*center, margin=1))
+        keep = set(self.map_data.chunk_range(*self.chunk_area(*center, margin=2)))
+        for key in self.map_data.unload_outside(keep):
+            self.chunk_layers.pop(key, None)
+
+    def change_level(self, number):
+        # Switches as soon as the level is ready; until then the current level keeps running
+        if 1 <= number <= self.num_levels:
+            self.target_level = number
+            self.levels.request(number)
+
+    def go_down(self):
+        self.change_level(self.current_level + 1)
+
+    def go_up(self):
+        self.change_level(self.current_level - 1)
+
+    def enter_level(self, level):
+        self.level = level
+        self.map_data = level.map_data
+        self.world_items = level.items  # Each level keeps its own dropped items
+        self.current_level = level.number
+        self.chunk_layers = {}
+        self.last_view = None  # Forces a full repaint
+        width, height = self.map_size
+        self.camera.set_world_size(width * self.tile_size, height * self.tile_size)
+        if self.player:
+            self.player.passability = level.passability
+            self.player.place(*(self.spawn or self.get_entrance_coords()))
+        self.spawn = None
+        neighbours = [n for n in (level.number + 1, level.number - 1) if 1 <= n <= self.num_levels]
+        self.levels.visit(level.number, neighbours)
+
+    def generate_cavern(self, number):
+        # Whole level in one vectorized pass; ore veins get richer with depth
+        width, height = self.map_size
+        entrance = (self.get_entrance_coords()[0] // self.tile_size, self.get_entrance_coords()[1] // self.tile_size)
+        return generate_cavern(self.rng(number, "cavern").getrandbits(64), width, height,
+                               self.floor_tile, self.unusable_tile, self.cobblestone_tile, entrance,
+                               vein_density=min(self.cobblestone_density + 0.002 * number, 0.2))
+
+    def generate_chunk(self, number, chunk, cx, cy):
+        origin_x = cx * self.chunk_size
+        origin_y = cy * self.chunk_size
+        self.generate_walls(chunk, origin_x, origin_y)
+        self.generate_cobblestones(chunk, origin_x, origin_y,
+                                   round(chunk.width * chunk.height * self.cobblestone_density),
+                                   self.rng(number, cx, cy))
+
+    def generate_walls(self, chunk, origin_x, origin_y):
+        # Only the outer border of the level is wall
+        width, height = self.map_size
+        if origin_x == 0:
+            chunk.fill(self.unusable_tile, 0, 0, 1, chunk.height)
+        if origin_y == 0:
+            chunk.fill(self.unusable_tile, 0, 0, chunk.width, 1)
+        if origin_x + chunk.width == width:
+            chunk.fill(self.unusable_tile, chunk.width - 1, 0, 1, chunk.height)
+        if origin_y + chunk.height == height:
+            chunk.fill(self.unusable_tile, 0, chunk.height - 1, chunk.width, 1)
+
+    def generate_cobblestones(self, chunk, origin_x, origin_y, num_cobblestones, rng):
         for _ in range(num_cobblestones):
-            x = random.randint(1, width - 2)
-            y = random.randint(1, height - 2)
-            if self.map_data[y][x] != self.unusable_tile:
-                self.map_data[y][x] = "cobblestone"
+            x = rng.randint(0, chunk.width - 1)
+            y = rng.randint(0, chunk.height - 1)
+            if chunk.get(x, y) != self.unusable_tile:
+                chunk.set(x, y, self.cobblestone_tile)
 
-    def draw(self, screen):
-        # ... (draw remains largely the same, but see below) ...
-        for y, row in enumerate(self.map_data):
-            for x, tile_type in enumerate(row):
-                if tile_type in self.tile_images:
-                    tile_image = self.tile_images[tile_type]
-                    screen.blit(tile_image, (x * self.tile_size, y * self.tile_size))
-                else:
-                    print(f"Warning: Tile type '{tile_type}' not found in tile_images.")
+    def render_chunk(self, cx, cy):
+        # Bake one chunk into a surface so drawing it is a single blit per frame
+        chunk = self.map_data.chunk(cx, cy)
+        layer = pygame.Surface((chunk.width * self.tile_size, chunk.height * self.tile_size)).convert()
+        self.chunk_layers[(cx, cy)] = layer
+        for y in range(chunk.height):
+            for x in range(chunk.width):
+                self.render_tile(cx * self.chunk_size + x, cy * self.chunk_size + y)
+        return layer
 
-        # Draw all sprites in SceneManager's group
-        self.all_sprites.draw(screen) #Removed self.sprites.draw
+    def render_tile(self, map_x, map_y):
+        # Re-render a single cell of its chunk layer (used after the map changes)
+        layer = self.chunk_layers.get((map_x // self.chunk_size, map_y // self.chunk_size))
+        if layer is None:
+            return  # Chunk is not on screen, it is rendered fresh when it comes into view
+        dest = ((map_x % self.chunk_size) * self.tile_size, (map_y % self.chunk_size) * self.tile_size)
+        tile_id = self.map_data.get(map_x, map_y)
+        tile_image = self.tiles.image(tile_id)
+        if tile_image is None:
+            layer.fill((0, 0, 0), pygame.Rect(dest, (self.tile_size, self.tile_size)))
+            if tile_id not in self.missing_tiles:
+                self.missing_tiles.add(tile_id)
+                print(f"Warning: Tile type '{self.tiles.name(tile_id)}' not found in tile_images.")
+            return
+        layer.blit(tile_image, dest)
 
+    def collect_dirty(self, pipeline):
+        if self.player:
+            # Draw the player between its last two ticks so motion stays smooth at any frame rate
+            self.player_rect = self.player.interpolated_rect(pipeline.alpha)
+            self.camera.follow(self.player_rect)
+        if self.camera.view.topleft != self.last_view:
+            # Scrolling moves everything on screen
+            self.last_view = self.camera.view.topleft
+            pipeline.invalidate()
+        if self.map_data is None:
+            pipeline.invalidate()
+        for rect in self.changed_tiles:
+            pipeline.invalidate(self.camera.apply(rect))
+        self.changed_tiles = []
+        for rect in self.world_items.take_changed():
+            pipeline.invalidate(self.camera.apply(rect))
 
-    def handle_input(self, event):
+        # Only sprites inside the view are tracked and drawn
+        self.visible_sprites = self.all_sprites.index.query_rect(self.camera.view, self.all_sprites.index.cell_size)
+        for sprite in self.visible_sprites:
+            if sprite is not self.player:
+                pipeline.track(sprite, self.camera.apply(sprite.rect), sprite.image)
+        if self.player:
+            pipeline.track(self.player, self.camera.apply(self.player_rect), self.player.image)
         if self.player:
-            self.player.run(event) # Use the event handling from the player itself
+            self.player.track_ui(pipeline)
+
+    def draw_layer(self, layer, screen):
+        if layer == "tiles":
+            self.draw_tiles(screen)
+        elif layer == "world":
+            self.world_items.draw(screen, self.camera.view, self.camera.offset)
+            for sprite in self.visible_sprites:
+                if sprite is not self.player:
+                    self.sprite_batch.add(sprite.image, self.camera.apply(sprite.rect))
+            self.sprite_batch.flush(screen)
+        elif layer == "player":
+            if self.player:
+                screen.blit(self.player.image, self.camera.apply(self.player_rect))
+        elif layer == "ui":
+            if self.player:
+                self.player.draw_ui(screen)
+
+    def refresh_tile(self, map_x, map_y):
+        # After a map change: re-render the cell and repaint it on the next frame
+        self.render_tile(map_x, map_y)
+        self.changed_tiles.append(pygame.Rect(map_x * self.tile_size, map_y * self.tile_size,
+                                              self.tile_size, self.tile_size))
+
+    def draw_tiles(self, screen):
+        if self.map_data is None:
+            screen.fill((0, 0, 0))  # First level still generating
+            return
+        # Chunks one ring past the view are kept rendered, everything further out is dropped
+        x0, y0, x1, y1 = self.camera.visible_tiles(self.tile_size)
+        near = set(self.map_data.chunk_range(x0 - self.chunk_size, y0 - self.chunk_size,
+                                             x1 + self.chunk_size, y1 + self.chunk_size))
+        for key in [key for key in self.chunk_layers if key not in near]:
+            del self.chunk_layers[key]
+
+        chunk_pixels = self.chunk_size * self.tile_size
+        offset_x, offset_y = self.camera.offset
+        for cx, cy in self.map_data.chunk_range(x0, y0, x1, y1):
+            layer = self.chunk_layers.get((cx, cy)) or self.render_chunk(cx, cy)
+            screen.blit(layer, (cx * chunk_pixels + offset_x, cy * chunk_pixels + offset_y))
+
+    def draw(self, screen):
+        # Full redraw of every layer, for callers outside the render pipeline
+        self.collect_dirty(RenderPipeline(screen))
+        for layer in RenderPipeline.LAYERS:
+            self.draw_layer(layer, screen)
 
     def update(self, dt):
-        if self.player:
-            self.player.update() # Removed dt,  The player's update doesn't need dt directly
-        self.all_sprites.update() # Update all sprites from SceneManager
+        if self.level is None or self.target_level != self.current_level:
+            level = self.levels.get(self.target_level)
+            if level is not None:
+                self.enter_level(level)
+        self.all_sprites.update(dt) # Update all sprites from SceneManager, the player included
+        self.stream_chunks()
+        self.world_items.update(dt) # One vectorized step for every dropped item
 
     def on_enter(self, player):
         self.player = player
+        self.last_view = None
+        player.passability = self.level.passability if self.level else None
         # The player is already added to all_sprites by the SceneManager
 
+    def on_exit(self):
+        if self.player:
+            self.player.passability = None
+
+    def shutdown(self):
+        self.levels.shutdown()
+
+    def restore(self, world_seed, level, tile_names, spawn=None):
+        # Switch to a saved world: same seed and tile IDs, levels rebuilt from the save's diffs
+        self.world_seed = world_seed
+        for name in tile_names:
+            self.tiles.register(name)
+        self.levels.reset()
+        self.level = None
+        self.map_data = None
+        self.world_items = WorldItems()
+        self.chunk_layers = {}
+        self.current_level = self.target_level = level
+        self.spawn = spawn
+        self.levels.request(level)
+
+    def navigation(self):
+        # Path finding graph of the current level, None while it is still being built
+        if self.level is None:
+            return None
+        if self.level.navigation is None:
+            self.level.navigation = NavGrid(self.level.passability)
+        return self.level.navigation
+
+    def player_tile(self):
+        ox, oy, width, height = self.player.HITBOX
+        return (int(self.player.pos_x + ox + width / 2) // self.tile_size,
+                int(self.player.pos_y + oy + height / 2) // self.tile_size)
+
+    def player_flow_field(self, max_cost=48):
+        # One field toward the player shared by every creature chasing them; rebuilt when the player changes tile
+        navigation = self.navigation()
+        if navigation is None or self.player is None:
+            return None
+        return navigation.flow_field(self.player_tile(), max_cost)
+
     def get_entrance_coords(self):
         return (self.tile_size * 1, self.tile_size * 1)
 
     def use_tile(self, x, y, new_tile_type):
+        if self.map_data is None:
+            return
         map_x = x // self.tile_size
         map_y = y // self.tile_size
-        if 0 <= map_x < len(self.map_data[0]) and 0 <= map_y < len(self.map_data):
-            self.map_data[map_y][map_x] = new_tile_type
+        if self.map_data.in_bounds(map_x, map_y):
+            self.level.set_tile(map_x, map_y, self.tiles.register(new_tile_type))
+            self.refresh_tile(map_x, map_y)
         else:
             print("Coordinates are outside the map bounds.")
 
     def destroy_cobblestone(self, x, y):
+        if self.map_data is None:
+            return
         map_x = x // self.tile_size
         map_y = y // self.tile_size
-        if 0 <= map_x < len(self.map_data[0]) and 0 <= map_y < len(self.map_data) and self.map_data[map_y][map_x] == "cobblestone":
-            for sprite in self.all_sprites: # Iterate through sprites in SceneManager's group
-                if isinstance(sprite, Cobblestone) and sprite.rect.topleft == (map_x * self.tile_size, map_y * self.tile_size):
-                    sprite.destroy(self.all_sprites, self.crystal_group)
-                    self.map_data[map_y][map_x] = "grass" #Update map data
-                    break
+        if self.map_data.in_bounds(map_x, map_y) and self.map_data.get(map_x, map_y) == self.cobblestone_tile:
+            center = ((map_x + 0.5) * self.tile_size, (map_y + 0.5) * self.tile_size)
+            destroy_cobblestone(self.cobblestone_loot, *center, self.world_items,
+                                self.rng(self.current_level, "drop", map_x, map_y))
+            self.level.set_tile(map_x, map_y, self.floor_tile) #Update map data and the level's diff log
+            self.refresh_tile(map_x, map_y)
+
+    def destroy_area(self, x, y, radius):
+        # Mines every cobblestone tile within radius pixels of (x, y) with one batched loot roll
+        if self.map_data is None:
+            return []
+        size = self.tile_size
+        x0, x1 = max((x - radius) // size, 0), min((x + radius) // size + 1, self.map_data.width)
+        y0, y1 = max((y - radius) // size, 0), min((y + radius) // size + 1, self.map_data.height)
+        tiles = [(map_x, map_y) for map_y in range(y0, y1) for map_x in range(x0, x1)
+                 if self.map_data.get(map_x, map_y) == self.cobblestone_tile
+                 and ((map_x + 0.5) * size - x) ** 2 + ((map_y + 0.5) * size - y) ** 2 <= radius ** 2]
+        centers = [((map_x + 0.5) * size, (map_y + 0.5) * size) for map_x, map_y in tiles]
+        rng = np.random.default_rng(self.rng(self.current_level, "blast", x, y).getrandbits(64))
+        destroy_cobblestones(self.cobblestone_loot, centers, self.world_items, rng)
+        for map_x, map_y in tiles:
+            self.level.set_tile(map_x, map_y, self.floor_tile)
+            self.refresh_tile(map_x, map_y)
+        return tiles
@@ -0,0 +1,159 @@
+from array import array
+
+import numpy as np
+
+from tilemap import TileMap
+
+
+# Cellular-automata caverns with noise-based cobblestone veins, built with whole-array
+# NumPy operations. Grids are uint8 arrays indexed [y, x] holding tile IDs.
+
+def neighbour_count(walls):
+    # Number of wall cells among the 8 neighbours; cells outside the map count as wall
+    padded = np.pad(walls.astype(np.uint8), 1, constant_values=1)
+    height, width = walls.shape
+    total = np.zeros(walls.shape, dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy != 1 or dx != 1:
+                total += padded[dy:dy + height, dx:dx + width]
+    return total
+
+
+def cellular_caverns(rng, width, height, fill=0.45, iterations=4):
+    # True where the cave is solid rock
+    walls = rng.random((height, width)) < fill
+    for _ in range(iterations):
+        count = neighbour_count(walls)
+        walls = (count >= 5) | (walls & (count >= 4))
+    return walls
+
+
+def value_noise(rng, width, height, scale):
+    # Smooth noise in [0, 1): random lattice values bilinearly interpolated every `scale` cells
+    lattice = rng.random((height // scale + 2, width // scale + 2))
+    ys = np.arange(height) / scale
+    xs = np.arange(width) / scale
+    y0 = ys.astype(np.intp)
+    x0 = xs.astype(np.intp)
+    ty = (ys - y0)[:, None]
+    tx = (xs - x0)[None, :]
+    top = lattice[y0][:, x0] * (1 - tx) + lattice[y0][:, x0 + 1] * tx
+    bottom = lattice[y0 + 1][:, x0] * (1 - tx) + lattice[y0 + 1][:, x0 + 1] * tx
+    return top * (1 - ty) + bottom * ty
+
+
+def floor_runs(floor):
+    # Horizontal runs of floor cells as (row, start, end) arrays, end exclusive, in row-major order
+    height, width = floor.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = floor
+    edges = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return start_rows, starts, ends
+
+
+def label_runs(rows, starts, ends, width):
+    # Connected components (4-neighbour) of floor runs. Runs on adjacent rows that overlap
+    # are joined, then labels are merged by min-propagation with pointer jumping.
+    count = len(rows)
+    labels = np.arange(count)
+    if count == 0:
+        return labels
+    stride = width + 1
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    # For every run, the runs on the next row with start < this end and end > this start
+    first = np.searchsorted(end_keys, (rows + 1) * stride + starts, side="right")
+    last = np.searchsorted(start_keys, (rows + 1) * stride + ends, side="left")
+    spans = np.maximum(last - first, 0)
+    a = np.repeat(np.arange(count), spans)
+    b = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans) + np.repeat(first, spans)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def paint_runs(grid, rows, starts, ends, tile_id):
+    # Fill the given runs with tile_id using one cumulative sum instead of per-run slicing
+    height, width = grid.shape
+    marks = np.zeros(height * (width + 1) + 1, dtype=np.int32)
+    stride = width + 1
+    np.add.at(marks, rows * stride + starts, 1)
+    np.add.at(marks, rows * stride + ends, -1)
+    mask = np.cumsum(marks)[:-1].reshape(height, stride)[:, :width] > 0
+    grid[mask] = tile_id
+
+
+def carve_tunnel(grid, start, end, tile_id):
+    # L-shaped corridor, horizontal first
+    (x0, y0), (x1, y1) = start, end
+    grid[y0, min(x0, x1):max(x0, x1) + 1] = tile_id
+    grid[min(y0, y1):max(y0, y1) + 1, x1] = tile_id
+
+
+def generate_cavern(seed, width, height, floor, wall, cobblestone, entrance=(1, 1),
+                    fill=0.45, iterations=4, vein_scale=8, vein_density=0.12):
+    rng = np.random.default_rng(seed)
+    walls = cellular_caverns(rng, width, height, fill, iterations)
+
+    # Clear the entrance so the player never spawns inside rock
+    ex, ey = entrance
+    walls[max(ey - 1, 0):ey + 3, max(ex - 1, 0):ex + 3] = False
+    walls[0, :] = walls[-1, :] = True
+    walls[:, 0] = walls[:, -1] = True
+
+    grid = np.where(walls, wall, floor).astype(np.uint8)
+
+    # Keep the largest cavern plus the entrance's, drop every other pocket and join the two
+    rows, starts, ends = floor_runs(~walls)
+    labels = label_runs(rows, starts, ends, width)
+    sizes = np.bincount(labels, weights=ends - starts, minlength=len(labels))
+    largest = int(np.argmax(sizes))
+    entrance_run = np.nonzero((rows == ey) & (starts <= ex) & (ends > ex))[0]
+    entrance_label = int(labels[entrance_run[0]]) if len(entrance_run) else largest
+    dropped = (labels != largest) & (labels != entrance_label)
+    paint_runs(grid, rows[dropped], starts[dropped], ends[dropped], wall)
+    if entrance_label != largest:
+        member = labels == largest
+        cells_x = starts[member]
+        cells_y = rows[member]
+        nearest = int(np.argmin(np.abs(cells_x - ex) + np.abs(cells_y - ey)))
+        carve_tunnel(grid, (ex, ey), (int(cells_x[nearest]), int(cells_y[nearest])), floor)
+
+    # Cobblestone veins follow the peaks of a smooth noise field
+    noise = value_noise(rng, width, height, vein_scale)
+    threshold = np.quantile(noise, 1 - vein_density)
+    grid[(grid == floor) & (noise >= threshold)] = cobblestone
+    grid[ey, ex] = floor
+    return grid
+
+
+def fill_chunked(map_data, grid):
+    # Copy a full-level grid into the chunks of a ChunkedTileMap
+    size = map_data.chunk_size
+    for cy in range(map_data.chunks_y):
+        for cx in range(map_data.chunks_x):
+            block = np.ascontiguousarray(grid[cy * size:(cy + 1) * size, cx * size:(cx + 1) * size])
+            chunk = TileMap(block.shape[1], block.shape[0])
+            chunk.tiles = array("B", block.tobytes())
+            map_data.chunks[(cx, cy)] = chunk
+
+
+def chunked_grid(map_data, missing=None):
+    # The inverse of fill_chunked: a full-level [y, x] grid from the chunks of a ChunkedTileMap.
+    # Chunks not generated yet read as missing (the map's fill tile by default).
+    size = map_data.chunk_size
+    fill = map_data.fill_tile if missing is None else missing
+    grid = np.full((map_data.height, map_data.width), fill, dtype=np.uint8)
+    for (cx, cy), chunk in map_data.chunks.items():
+        block = np.frombuffer(chunk.tiles, dtype=np.uint8).reshape(chunk.height, chunk.width)
+        grid[cy * size:cy * size + chunk.height, cx * size:cx * size + chunk.width] = block
+    return grid
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class PassabilityMap:
+    # One bit per tile, set where the tile blocks movement. Rows are packed little-endian,
+    # so tile x of row y is bit (x & 7) of byte y * stride + (x >> 3). Tiles outside the
+    # map count as blocked.
+    def __init__(self, grid, solid):
+        self.solid = solid  # TileRegistry.solid lookup table, shared so newly marked tiles apply
+        self.height, self.width = grid.shape
+        lut = np.frombuffer(bytes(solid), dtype=np.uint8)
+        packed = np.packbits(lut[grid], axis=1, bitorder="little")
+        self.stride = packed.shape[1]
+        self.bits = bytearray(packed.tobytes())
+
+    def blocked(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return True
+        return self.bits[y * self.stride + (x >> 3)] >> (x & 7) & 1
+
+    def set_blocked(self, x, y, blocked):
+        index = y * self.stride + (x >> 3)
+        if blocked:
+            self.bits[index] |= 1 << (x & 7)
+        else:
+            self.bits[index] &= ~(1 << (x & 7)) & 0xFF
+
+    def update(self, x, y, tile_id):
+        # Keeps the mask in step with a single tile change
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.set_blocked(x, y, self.solid[tile_id])
+
+    def update_area(self, x0, y0, tiles):
+        # A whole TileMap (e.g. a freshly generated chunk) placed at tile (x0, y0)
+        solid = self.solid
+        for y in range(tiles.height):
+            row = tiles.row(y)
+            for x in range(tiles.width):
+                self.set_blocked(x0 + x, y0 + y, solid[row[x]])
+
+    def column_blocked(self, x, y0, y1):
+        for y in range(y0, y1 + 1):
+            if self.blocked(x, y):
+                return True
+        return False
+
+    def row_blocked(self, y, x0, x1):
+        for x in range(x0, x1 + 1):
+            if self.blocked(x, y):
+                return True
+        return False
+
+
+EPSILON = 1e-6  # Right and bottom edges are exclusive
+
+
+def sweep_x(passability, tile_size, x, y, width, height, dx):
+    # New left edge after moving a box by dx, stopped at the first blocked column it would enter.
+    # Only columns between the old and new edge are checked, so a box that starts inside a wall can leave it.
+    if dx == 0:
+        return x
+    top = int(y // tile_size)
+    bottom = int((y + height - EPSILON) // tile_size)
+    if dx > 0:
+        first = int((x + width - EPSILON) // tile_size) + 1
+        last = int((x + width + dx - EPSILON) // tile_size)
+        for column in range(first, last + 1):
+            if passability.column_blocked(column, top, bottom):
+                return column * tile_size - width
+    else:
+        first = int(x // tile_size) - 1
+        last = int((x + dx) // tile_size)
+        for column in range(first, last - 1, -1):
+            if passability.column_blocked(column, top, bottom):
+                return (column + 1) * tile_size
+    return x + dx
+
+
+def sweep_y(passability, tile_size, x, y, width, height, dy):
+    if dy == 0:
+        return y
+    left = int(x // tile_size)
+    right = int((x + width - EPSILON) // tile_size)
+    if dy > 0:
+        first = int((y + height - EPSILON) // tile_size) + 1
+        last = int((y + height + dy - EPSILON) // tile_size)
+        for row in range(first, last + 1):
+            if passability.row_blocked(row, left, right):
+                return row * tile_size - height
+    else:
+        first = int(y // tile_size) - 1
+        last = int((y + dy) // tile_size)
+        for row in range(first, last - 1, -1):
+            if passability.row_blocked(row, left, right):
+                return (row + 1) * tile_size
+    return y + dy
+
+
+def move_box(passability, tile_size, box, dx, dy):
+    # Swept AABB against the tile grid, one axis at a time so boxes slide along walls.
+    # box is (x, y, width, height) in pixels, floats allowed; returns the new (x, y).
+    x, y, width, height = box
+    x = sweep_x(passability, tile_size, x, y, width, height, dx)
+    y = sweep_y(passability, tile_size, x, y, width, height, dy)
+    return x, y
@@ -0,0 +1,225 @@
+import numpy as np
+import pygame
+
+from Object import ItemStack
+
+
+CELL_OFFSET = 1 << 15  # Keeps cell coordinates positive for items scattered past the map edge
+CELL_STRIDE = 1 << 16
+
+
+class WorldItems:
+    # Passive items lying in the world (dropped crystals and the like), stored as parallel
+    # arrays instead of one Sprite each. Rows 0..count-1 are live, and removal compacts
+    # the arrays with one masked copy.
+    # Everything an item needs beyond its position lives in its type: kind, name, image,
+    # aspects and price, shared by every item of that type.
+    # Queries go through a coarse cell index: item indices sorted by cell, rebuilt lazily
+    # after items spawn, move or go, so a query only scans the cells it overlaps.
+    def __init__(self, capacity=1024, damping=0.85, cell_size=128):
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)  # Pixels per second, from the scatter on drop
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.type_id = np.zeros(capacity, dtype=np.int32)
+        self.damping = damping  # Velocity kept per 1/60 s
+        self.types = []  # type ID -> (kind, name, image, aspects, price)
+        self.type_ids = {}  # (kind, name, image, aspects, price) -> type ID
+        self.images = []  # type ID -> image, indexed while drawing
+        self.max_size = (0, 0)  # Largest item image, for dirty rects
+        self.changed = []  # World rects that need repainting, drained by the scene
+        self.rng = np.random.default_rng(0)  # Only used for the visual scatter of drops
+        self.cell_size = cell_size
+        self.order = None  # Item indices sorted by cell, None when stale
+        self.sorted_cells = None  # Cell ID of each entry in order
+        self.version = 0  # Bumped whenever items spawn, move or go, so saves can skip untouched levels
+
+    def __len__(self):
+        return self.count
+
+    def item_type(self, kind, name, image, aspects=(), price=0):
+        key = (kind, name, image, tuple(aspects), price)
+        type_id = self.type_ids.get(key)
+        if type_id is None:
+            type_id = self.type_ids[key] = len(self.types)
+            self.types.append(key)
+            self.images.append(image)
+            width, height = image.get_size()
+            self.max_size = (max(self.max_size[0], width), max(self.max_size[1], height))
+        return type_id
+
+    def to_stack(self, type_id, count=1):
+        kind, name, image, aspects, price = self.types[type_id]
+        return ItemStack(name, kind, image, count, aspects, price)
+
+    def stack_type(self, stack):
+        return self.item_type(stack.kind, stack.name, stack.image, stack.aspects, stack.price)
+
+    def grow(self, needed):
+        capacity = len(self.x)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("x", "y", "vx", "vy", "type_id"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def spawn(self, type_id, x, y, amount=1, scatter=0.0):
+        # amount items of one type at (x, y); scatter > 0 throws them outward at up to that speed
+        start = self.count
+        end = start + amount
+        if end > len(self.x):
+            self.grow(end)
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.type_id[start:end] = type_id
+        if scatter:
+            angle = self.rng.random(amount) * 2 * np.pi
+            speed = self.rng.random(amount) * scatter
+            self.vx[start:end] = np.cos(angle) * speed
+            self.vy[start:end] = np.sin(angle) * speed
+        else:
+            self.vx[start:end] = 0
+            self.vy[start:end] = 0
+        self.count = end
+        self.order = None
+        self.version += 1
+        self.mark_changed(start, end)
+        return np.arange(start, end)
+
+    def spawn_many(self, type_id, xs, ys):
+        start = self.count
+        end = start + len(xs)
+        if end > len(self.x):
+            self.grow(end)
+        self.x[start:end] = xs
+        self.y[start:end] = ys
+        self.vx[start:end] = 0
+        self.vy[start:end] = 0
+        self.type_id[start:end] = type_id
+        self.count = end
+        self.order = None
+        self.version += 1
+        self.mark_changed(start, end)
+
+    def spawn_stack(self, stack, x, y, scatter=0.0):
+        # Drops a whole stack centred on (x, y)
+        width, height = stack.image.get_size()
+        return self.spawn(self.stack_type(stack), x - width / 2, y - height / 2, stack.count, scatter)
+
+    def remove(self, indices):
+        if len(indices) == 0:
+            return
+        count = self.count
+        keep = np.ones(count, dtype=bool)
+        keep[indices] = False
+        self.mark_changed(indices=indices)
+        for name in ("x", "y", "vx", "vy", "type_id"):
+            array = getattr(self, name)
+            kept = array[:count][keep]
+            array[:len(kept)] = kept
+        self.count = int(keep.sum())
+        self.order = None
+        self.version += 1
+
+    def clear(self):
+        self.mark_changed(0, self.count)
+        self.count = 0
+        self.order = None
+        self.version += 1
+
+    def update(self, dt):
+        # Every moving item integrated at once; items stop when their speed gets small
+        count = self.count
+        vx = self.vx[:count]
+        vy = self.vy[:count]
+        moving = np.nonzero((vx != 0) | (vy != 0))[0]
+        if len(moving) == 0:
+            return
+        self.mark_changed(indices=moving)
+        self.order = None
+        self.version += 1
+        self.x[moving] += vx[moving] * dt
+        self.y[moving] += vy[moving] * dt
+        factor = np.float32(self.damping ** (dt * 60))
+        vx[moving] *= factor
+        vy[moving] *= factor
+        slow = moving[vx[moving] ** 2 + vy[moving] ** 2 < 4.0]
+        vx[slow] = 0
+        vy[slow] = 0
+        self.mark_changed(indices=moving)
+
+    def mark_changed(self, start=0, end=0, indices=None):
+        # One bounding rect per call, not one per item
+        xs = self.x[indices] if indices is not None else self.x[start:end]
+        ys = self.y[indices] if indices is not None else self.y[start:end]
+        if len(xs):
+            x0 = int(xs.min())
+            y0 = int(ys.min())
+            width, height = self.max_size
+            self.changed.append(pygame.Rect(x0, y0, int(xs.max()) - x0 + width + 1, int(ys.max()) - y0 + height + 1))
+
+    def take_changed(self):
+        changed, self.changed = self.changed, []
+        return changed
+
+    def cells(self, xs, ys):
+        cell_x = np.floor_divide(xs, self.cell_size).astype(np.int64) + CELL_OFFSET
+        cell_y = np.floor_divide(ys, self.cell_size).astype(np.int64) + CELL_OFFSET
+        return cell_y * CELL_STRIDE + cell_x
+
+    def candidates(self, left, top, right, bottom):
+        # Indices of items whose position lies in a cell overlapping the rect; one binary
+        # search per cell row, since a row's cells are contiguous in the sorted order
+        count = self.count
+        if count == 0:
+            return np.zeros(0, dtype=np.intp)
+        if self.order is None:
+            cells = self.cells(self.x[:count], self.y[:count])
+            self.order = np.argsort(cells, kind="stable")
+            self.sorted_cells = cells[self.order]
+        size = self.cell_size
+        x0 = int(left // size) + CELL_OFFSET
+        x1 = int(right // size) + CELL_OFFSET
+        rows = np.arange(int(top // size), int(bottom // size) + 1, dtype=np.int64) + CELL_OFFSET
+        starts = np.searchsorted(self.sorted_cells, rows * CELL_STRIDE + x0, side="left")
+        ends = np.searchsorted(self.sorted_cells, rows * CELL_STRIDE + x1, side="right")
+        order = self.order
+        return np.sort(np.concatenate([order[start:end] for start, end in zip(starts.tolist(), ends.tolist())]))  # Index order, as drawn
+
+    def within(self, pos, radius):
+        # Indices of items whose centre is within radius of pos
+        width, height = self.max_size
+        left = pos[0] - width / 2
+        top = pos[1] - height / 2
+        indices = self.candidates(left - radius, top - radius, left + radius, top + radius)
+        dx = self.x[indices] - left
+        dy = self.y[indices] - top
+        return indices[dx * dx + dy * dy <= radius * radius]
+
+    def in_rect(self, rect, margin=0):
+        width, height = self.max_size
+        indices = self.candidates(rect.left - width - margin, rect.top - height - margin,
+                                  rect.right + margin, rect.bottom + margin)
+        xs = self.x[indices]
+        ys = self.y[indices]
+        return indices[(xs >= rect.left - width - margin) & (xs < rect.right + margin) &
+                       (ys >= rect.top - height - margin) & (ys < rect.bottom + margin)]
+
+    def by_type(self, indices):
+        # {type ID: item indices} for a set of items, e.g. everything under the player
+        types = self.type_id[indices]
+        return {int(type_id): indices[types == type_id] for type_id in np.unique(types)}
+
+    def draw(self, screen, view, offset):
+        # Visible items in one blits call
+        visible = self.in_rect(view)
+        if len(visible) == 0:
+            return
+        images = self.images
+        xs = (self.x[visible] + offset[0]).astype(np.int32).tolist()
+        ys = (self.y[visible] + offset[1]).astype(np.int32).tolist()
+        screen.blits([(images[type_id], (x, y)) for type_id, x, y in zip(self.type_id[visible].tolist(), xs, ys)],
+                     doreturn=False)
@@ -0,0 +1,113 @@
+import pygame
+
+
+MOUSE_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION)
+
+
+class Region:
+    # A screen rect that receives mouse events inside it, e.g. a button or the inventory grid
+    def __init__(self, rect, handlers, hover=None, scope=None):
+        self.rect = pygame.Rect(rect)
+        self.handlers = handlers  # event type -> handler(event)
+        self.hover = hover  # Called with True/False when the mouse enters or leaves
+        self.scope = scope
+
+
+class EventBus:
+    # Routes each event to the handlers subscribed to its type (and key, for keyboard
+    # events) with dict lookups, and mouse events to the regions under the cursor through
+    # a coarse grid, so dispatch cost does not grow with the number of listeners.
+    # Subscriptions with a scope (usually a scene) only fire while that scope is active.
+    # A handler that returns True consumes the event.
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.handlers = {}  # (scope, event type) -> [handler]
+        self.key_handlers = {}  # (scope, event type, key) -> [handler]
+        self.cells = {}  # (scope, cell_x, cell_y) -> [Region]
+        self.hovered = set()
+        self.scope = None  # Active scope; None-scoped subscriptions are always active
+
+    def subscribe(self, event_type, handler, scope=None):
+        self.handlers.setdefault((scope, event_type), []).append(handler)
+
+    def subscribe_key(self, event_type, key, handler, scope=None):
+        self.key_handlers.setdefault((scope, event_type, key), []).append(handler)
+
+    def unsubscribe(self, event_type, handler, scope=None):
+        handlers = self.handlers.get((scope, event_type), [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def region_cells(self, region):
+        rect = region.rect
+        for cell_y in range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1):
+            for cell_x in range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1):
+                yield (region.scope, cell_x, cell_y)
+
+    def add_region(self, rect, handlers, hover=None, scope=None):
+        region = Region(rect, handlers, hover, scope)
+        for key in self.region_cells(region):
+            self.cells.setdefault(key, []).append(region)
+        return region
+
+    def remove_region(self, region):
+        for key in self.region_cells(region):
+            cell = self.cells.get(key)
+            if cell and region in cell:
+                cell.remove(region)
+                if not cell:
+                    del self.cells[key]
+        self.hovered.discard(region)
+
+    def move_region(self, region, rect):
+        self.remove_region(region)
+        region.rect = pygame.Rect(rect)
+        for key in self.region_cells(region):
+            self.cells.setdefault(key, []).append(region)
+
+    def regions_at(self, pos):
+        cell_x = int(pos[0]) // self.cell_size
+        cell_y = int(pos[1]) // self.cell_size
+        hits = []
+        for scope in (self.scope, None) if self.scope is not None else (None,):
+            for region in self.cells.get((scope, cell_x, cell_y), ()):
+                if region.rect.collidepoint(pos):
+                    hits.append(region)
+        return hits
+
+    def set_scope(self, scope):
+        for region in self.hovered:
+            if region.hover:
+                region.hover(False)
+        self.hovered = set()
+        self.scope = scope
+
+    def update_hover(self, hits):
+        current = {region for region in hits if region.hover}
+        for region in self.hovered - current:
+            region.hover(False)
+        for region in current - self.hovered:
+            region.hover(True)
+        self.hovered = current
+
+    def dispatch(self, event):
+        scopes = (self.scope, None) if self.scope is not None else (None,)
+        if event.type in MOUSE_EVENTS:
+            hits = self.regions_at(event.pos)
+            if event.type == pygame.MOUSEMOTION:
+                self.update_hover(hits)
+            for region in hits:
+                handler = region.handlers.get(event.type)
+                if handler and handler(event):
+                    return True
+        key = getattr(event, "key", None)
+        if key is not None:
+            for scope in scopes:
+                for handler in self.key_handlers.get((scope, event.type, key), ()):
+                    if handler(event):
+                        return True
+        for scope in scopes:
+            for handler in self.handlers.get((scope, event.type), ()):
+                if handler(event):
+                    return True
+        return False
@@ -2,47 +2,65 @@ from menu import MenuScene
 from scene import SceneManager
 from cart import CaveScene
 from Object import *
+from atlas import atlas_sources, build_atlases
+from timestep import FixedTimestep
 
 # Example Usage:
 pygame.init()
 screen = pygame.display.set_mode((800, 800))
+# Nothing is decoded up front: each scene streams its images in behind the loading scene
+world_manifest = WORLD_ASSETS + atlas_sources(assets, ATLAS_DIRECTORY, ATLAS_SHEETS)
+atlases = []
 
 scene_manager = SceneManager(screen)
 
-menu_scene = MenuScene(scene_manager)
-game_scene = CaveScene(screen, scene_manager, tile_images={"grass": loadim("Map/rамень.png"),
-                                                           "plantable": loadim("Map/земля.png"),
-                                                           "wall": loadim("Map/rамень.png")
-                                                           })
 
-cave_scene = CaveScene(screen, scene_manager, tile_images={"grass": loadim("Map/rамень.png"),
-                                                           "plantable": loadim("Map/земля.png"),
-                                                           "wall": loadim("Map/rамень.png")
-                                                           })
+def cave_tiles():
+    # Runs on the main thread once the world images are in; the atlases are packed the first time
+    if not atlases:
+        atlases.extend(build_atlases(assets, world_manifest[len(WORLD_ASSETS):]))
+    return {"grass": loadim("Map/rамень.png"),
+            "plantable": loadim("Map/земля.png"),
+            "wall": loadim("Map/rамень.png")
+            }
 
 
-scene_manager.add_scene("menu", menu_scene)
-scene_manager.add_scene("game", game_scene)
-scene_manager.add_scene("cave", cave_scene)
+scene_manager.add_lazy_scene("menu", lambda: MenuScene(scene_manager), MENU_ASSETS)
+scene_manager.add_lazy_scene("game", lambda: CaveScene(screen, scene_manager, tile_images=cave_tiles()),
+                             world_manifest)
+scene_manager.add_lazy_scene("cave", lambda: CaveScene(screen, scene_manager, tile_images=cave_tiles(),
+                                                       map_size=(256, 256)), world_manifest)
 
 scene_manager.set_scene("menu")
+assets.stream(world_manifest)  # Decoded behind the menu, so New Game rarely has to wait
 
 clock = pygame.time.Clock()
+timestep = FixedTimestep(1 / SIMULATION_RATE, MAX_CATCH_UP_STEPS)
+profiler = scene_manager.profiler
 running = True
 
 while running:
-    dt = clock.tick(60) / 1000.0  # Delta time in seconds
+    dt = clock.tick(FRAME_RATE_LIMIT) / 1000.0  # Delta time in seconds
+    profiler.begin_frame()
 
-    for event in pygame.event.get():
+    events = pygame.event.get()
+    profiler.mark("events")
+    for event in events:
         if event.type == pygame.QUIT:
             running = False
         scene_manager.handle_input(event)
-        if scene_manager.player:
-            scene_manager.player.run(event)
+    profiler.mark("input")
 
+    # Simulation runs in fixed ticks, rendering interpolates between the last two
+    for _ in range(timestep.advance(dt)):
+        scene_manager.update(timestep.step)
+    profiler.mark("update")
+    dirty_rects = scene_manager.draw(timestep.alpha)
+    profiler.mark("draw")
+    if dirty_rects:
+        pygame.display.update(dirty_rects)  # Only the areas that changed this frame
+    profiler.mark("flip")
+    profiler.end_frame(scene_manager.sprite_counts())
 
-    scene_manager.update(dt)
-    scene_manager.draw()
-    pygame.display.flip()
-
+scene_manager.shutdown()
 pygame.quit()
@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+
+STAGE_EPSILON = 1e-9  # Summing a speed like 0.1 ten times lands just under 1.0
+
+
+def visible_stage(progress):
+    return int(progress + STAGE_EPSILON)
+
+
+class CrystalFarm:
+    # All crystal piles stored as parallel arrays and grown together once per day.
+    # A timer wheel keyed by day remembers when each pile's visible stage will next
+    # change, so only those sprites are touched.
+    def __init__(self, capacity=256):
+        self.progress = np.zeros(capacity, dtype=np.float64)  # Fractional growth stage
+        self.speed = np.zeros(capacity, dtype=np.float64)  # Stages per day
+        self.max_growth = np.zeros(capacity, dtype=np.float64)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.piles = [None] * capacity  # Slot -> CrystalPile sprite
+        self.slots = {}  # CrystalPile -> slot
+        self.free = list(range(capacity - 1, -1, -1))
+        self.day = 0
+        self.wheel = {}  # day -> slots whose visible stage changes that day
+
+    def grow_arrays(self):
+        old = len(self.active)
+        for name in ("progress", "speed", "max_growth", "x", "y", "active"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(old, dtype=array.dtype)]))
+        self.piles.extend([None] * old)
+        self.free.extend(range(2 * old - 1, old - 1, -1))
+
+    def add(self, pile):
+        if not self.free:
+            self.grow_arrays()
+        slot = self.free.pop()
+        self.progress[slot] = pile.growth_stage
+        self.speed[slot] = pile.growth_speed
+        self.max_growth[slot] = pile.max_growth
+        self.x[slot], self.y[slot] = pile.rect.topleft
+        self.active[slot] = True
+        self.piles[slot] = pile
+        self.slots[pile] = slot
+        pile.farm = self
+        self.schedule(slot)
+        return slot
+
+    def remove(self, pile):
+        slot = self.slots.pop(pile, None)
+        if slot is None:
+            return
+        self.active[slot] = False
+        self.piles[slot] = None
+        self.free.append(slot)  # Stale wheel entries for this slot are skipped when popped
+        pile.farm = None
+
+    def schedule(self, slot):
+        progress = self.progress[slot]
+        speed = self.speed[slot]
+        if speed <= 0 or progress >= self.max_growth[slot]:
+            return
+        days = max(math.ceil((visible_stage(progress) + 1 - progress) / speed - STAGE_EPSILON), 1)
+        self.wheel.setdefault(self.day + days, []).append((slot, self.piles[slot]))
+
+    def advance_day(self):
+        # One vectorized step for every pile, then sprite updates only where the stage changed
+        self.day += 1
+        np.minimum(self.progress + self.speed * self.active, self.max_growth, out=self.progress)
+        changed = []
+        for slot, pile in self.wheel.pop(self.day, ()):
+            if self.piles[slot] is not pile:
+                continue  # Harvested or replaced since it was scheduled
+            stage = visible_stage(self.progress[slot])
+            if stage != pile.growth_stage:
+                pile.set_stage(stage)
+                changed.append(pile)
+            self.schedule(slot)
+        return changed
+
+    def ripe(self):
+        # Piles that reached their final stage
+        slots = np.nonzero(self.active & (self.progress + STAGE_EPSILON >= self.max_growth))[0]
+        return [self.piles[slot] for slot in slots]
+
+    def __len__(self):
+        return len(self.slots)
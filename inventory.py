@@ -0,0 +1,176 @@
+import heapq
+
+
+def stack_key(stack):
+    # Stacks with the same key merge into one slot
+    return (stack.name, stack.kind, stack.aspects)
+
+
+class Container:
+    # Slot storage shared by the player inventory and chests.
+    # Free slots sit in a min-heap (lowest index first) and every item key maps to the
+    # slots holding it, so adding, stacking and counting never scan the whole grid.
+    def __init__(self, rows, cols, stack_limit=99):
+        self.rows = rows
+        self.cols = cols
+        self.stack_limit = stack_limit
+        self.slots = [None] * (rows * cols)  # Row-major; index = row * cols + col
+        self.free = list(range(rows * cols))  # Heap; may hold stale indices, checked on pop
+        self.index = {}  # key -> set of slot indices holding that key
+        self.counts = {}  # key -> total count
+        self.names = {}  # name -> set of keys with that name
+        self.version = 0  # Bumped on every change, lets the UI skip redraws
+
+    def slot(self, row, col):
+        return self.slots[row * self.cols + col]
+
+    def _place(self, i, stack):
+        key = stack_key(stack)
+        self.slots[i] = stack
+        self.index.setdefault(key, set()).add(i)
+        self.counts[key] = self.counts.get(key, 0) + stack.count
+        self.names.setdefault(stack.name, set()).add(key)
+
+    def _clear(self, i):
+        stack = self.slots[i]
+        key = stack_key(stack)
+        self.slots[i] = None
+        held = self.index[key]
+        held.discard(i)
+        self.counts[key] -= stack.count
+        if not held:
+            del self.index[key]
+            del self.counts[key]
+            keys = self.names[stack.name]
+            keys.discard(key)
+            if not keys:
+                del self.names[stack.name]
+        heapq.heappush(self.free, i)
+        return stack
+
+    def _resize(self, i, count):
+        stack = self.slots[i]
+        self.counts[stack_key(stack)] += count - stack.count
+        stack.count = count
+
+    def _pop_free(self):
+        while self.free:
+            i = heapq.heappop(self.free)
+            if self.slots[i] is None:
+                return i
+        return None
+
+    def set_slot(self, i, stack):
+        # Put a stack into a specific slot, returns whatever was there
+        old = self._clear(i) if self.slots[i] is not None else None
+        if stack is not None:
+            self._place(i, stack)
+        self.version += 1
+        return old
+
+    def take_slot(self, i):
+        return self.set_slot(i, None)
+
+    def add(self, stack):
+        # Stores as much of the stack as fits: tops up matching stacks, then uses free slots.
+        # Returns the count that did not fit (0 when everything was stored).
+        remaining = stack.count
+        key = stack_key(stack)
+        for i in sorted(self.index.get(key, ())):
+            room = self.stack_limit - self.slots[i].count
+            if room > 0:
+                moved = min(room, remaining)
+                self._resize(i, self.slots[i].count + moved)
+                remaining -= moved
+                if not remaining:
+                    break
+        while remaining:
+            i = self._pop_free()
+            if i is None:
+                break
+            moved = min(self.stack_limit, remaining)
+            self._place(i, self.copy_stack(stack, moved))
+            remaining -= moved
+        self.version += 1
+        return remaining
+
+    add_item = add
+
+    def copy_stack(self, stack, count):
+        return type(stack)(stack.name, stack.kind, stack.image, count, stack.aspects, stack.price)
+
+    def add_many(self, stacks):
+        # Returns the stacks (or parts of stacks) that did not fit
+        overflow = []
+        for stack in stacks:
+            left = self.add(stack)
+            if left:
+                overflow.append(self.copy_stack(stack, left))
+        return overflow
+
+    def count(self, item):
+        # Total of one key, or of every key with that name when given a string
+        if isinstance(item, str):
+            return sum(self.counts[key] for key in self.names.get(item, ()))
+        return self.counts.get(item, 0)
+
+    def keys_for(self, item):
+        return list(self.names.get(item, ())) if isinstance(item, str) else [item]
+
+    def remove(self, item, count):
+        # Takes up to count of a key (or name), newest slots first; returns how many were removed
+        removed = 0
+        for key in self.keys_for(item):
+            for i in sorted(self.index.get(key, ()), reverse=True):
+                if removed == count:
+                    break
+                taken = min(self.slots[i].count, count - removed)
+                if taken == self.slots[i].count:
+                    self._clear(i)
+                else:
+                    self._resize(i, self.slots[i].count - taken)
+                removed += taken
+        self.version += 1
+        return removed
+
+    def remove_many(self, requests):
+        # requests: {key or name: count}; returns {key or name: shortfall} for what was missing
+        shortfall = {}
+        for item, count in requests.items():
+            missing = count - self.remove(item, count)
+            if missing:
+                shortfall[item] = missing
+        return shortfall
+
+    def stacks(self):
+        return [stack for stack in self.slots if stack is not None]
+
+    def transfer(self, other, items=None):
+        # Moves everything (or the given keys/names) into another container.
+        # Whatever does not fit stays here; returns the stacks left behind.
+        if items is None:
+            slots = [i for i, stack in enumerate(self.slots) if stack is not None]
+        else:
+            slots = sorted(i for item in items for key in self.keys_for(item) for i in self.index.get(key, ()))
+        left = []
+        for i in slots:
+            stack = self._clear(i)
+            remaining = other.add(stack)
+            if remaining:
+                rest = self.copy_stack(stack, remaining)
+                self._place(i, rest)
+                left.append(rest)
+        self.version += 1
+        return left
+
+    def is_full(self):
+        return all(stack is not None for stack in self.slots)
+
+
+class Chest(Container):
+    def __init__(self, rows=3, cols=9, stack_limit=99):
+        super().__init__(rows, cols, stack_limit)
+
+    @property
+    def contents(self):
+        return self.stacks()
@@ -0,0 +1,150 @@
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from entities import WorldItems
+
+
+class LevelDiff:
+    # Append-only log of player tile changes on one level, replayed over the regenerated base.
+    # Stores a packed cell index and a tile ID per change: 5 bytes each.
+    def __init__(self, width):
+        self.width = width
+        self.cells = array("I")
+        self.tile_ids = array("B")
+        self.version = 0  # Bumped on every change, so saves can skip untouched levels
+
+    def record(self, x, y, tile_id):
+        self.cells.append(y * self.width + x)
+        self.tile_ids.append(tile_id)
+        self.version += 1
+        if len(self.cells) >= 1024 and len(self.cells) & (len(self.cells) - 1) == 0:
+            self.compact()  # Repeated edits of the same cell collapse to the latest one
+
+    def compact(self):
+        latest = dict(zip(self.cells, self.tile_ids))
+        self.cells = array("I", latest.keys())
+        self.tile_ids = array("B", latest.values())
+
+    def apply(self, map_data):
+        width = self.width
+        for cell, tile_id in zip(self.cells, self.tile_ids):
+            map_data.set(cell % width, cell // width, tile_id)
+
+    def replay(self, chunk, x0, y0):
+        # Only the changes inside one chunk at tile (x0, y0), for chunks regenerated on demand
+        width = self.width
+        for cell, tile_id in zip(self.cells, self.tile_ids):
+            x = cell % width - x0
+            y = cell // width - y0
+            if 0 <= x < chunk.width and 0 <= y < chunk.height:
+                chunk.set(x, y, tile_id)
+
+    def __len__(self):
+        return len(self.cells)
+
+
+class Level:
+    def __init__(self, number, map_data, diff, passability=None):
+        self.number = number
+        self.map_data = map_data
+        self.diff = diff  # Everything the player changed; outlives the level when it is evicted
+        self.passability = passability  # collision.PassabilityMap, kept in step with every tile change
+        self.navigation = None  # navigation.NavGrid, built the first time something needs a path
+        self.items = None  # entities.WorldItems lying on this level, attached by LevelStore
+
+    def chunk_loaded(self, cx, cy, chunk):
+        # ChunkedTileMap.on_load: a chunk was (re)generated, bring it and the maps built on it up to date
+        x0 = cx * self.map_data.chunk_size
+        y0 = cy * self.map_data.chunk_size
+        self.diff.replay(chunk, x0, y0)
+        if self.passability is not None:
+            self.passability.update_area(x0, y0, chunk)
+        if self.navigation is not None:
+            self.navigation.area_changed(x0, y0, x0 + chunk.width, y0 + chunk.height)
+
+    def set_tile(self, x, y, tile_id):
+        self.map_data.set(x, y, tile_id)
+        self.diff.record(x, y, tile_id)
+        if self.passability is not None:
+            self.passability.update(x, y, tile_id)
+        if self.navigation is not None:
+            self.navigation.tile_changed(x, y)
+
+
+class LevelStore:
+    # Builds levels on a worker pool and keeps the most recently visited ones in memory.
+    # build(number, diff) runs on a worker thread and returns a Level. Generation is
+    # deterministic, so evicted levels are simply dropped and rebuilt from their diff.
+    def __init__(self, build, max_levels=5, workers=2):
+        self.build = build
+        self.max_levels = max_levels
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="levelgen")
+        self.levels = OrderedDict()  # number -> Level, least recently visited first
+        self.pending = {}  # number -> Future
+        self.diffs = {}  # number -> LevelDiff for every level built so far
+        self.source = None  # number -> LevelDiff or None; reads diffs of unvisited levels from a save
+        self.items = {}  # number -> WorldItems; like diffs, kept when the level itself is evicted
+        self.items_source = None  # number -> WorldItems or None; reads a level's ground items from a save
+
+    def request(self, number):
+        # Start building a level in the background unless it is loaded or already queued
+        if number in self.levels or number in self.pending:
+            return
+        diff = self.diffs.get(number)
+        if diff is None and self.source is not None:
+            diff = self.source(number)  # Only decoded once the level is actually needed
+        self.pending[number] = self.executor.submit(self.build, number, diff)
+
+    def get(self, number):
+        # The level if it is ready, otherwise None (never waits on a worker)
+        self.poll()
+        level = self.levels.get(number)
+        if level is None:
+            self.request(number)
+        return level
+
+    def poll(self):
+        for number, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[number]
+                level = future.result()
+                self.diffs[number] = level.diff
+                level.items = self.items_for(number)
+                self.levels[number] = level
+                self.levels.move_to_end(number, last=False)  # Prefetched, not visited yet
+
+    def items_for(self, number):
+        # Main thread only: the store the level's dropped items live in
+        items = self.items.get(number)
+        if items is None:
+            if self.items_source is not None:
+                items = self.items_source(number)  # Only decoded once the level is actually needed
+            items = self.items[number] = items or WorldItems()
+        return items
+
+    def visit(self, number, prefetch=()):
+        # Mark a level as the most recently used, queue its neighbours and trim the cache
+        self.levels.move_to_end(number)
+        for neighbour in prefetch:
+            self.request(neighbour)
+        self.evict(keep=(number, *prefetch))
+
+    def evict(self, keep=()):
+        for number in list(self.levels):
+            if len(self.levels) <= self.max_levels:
+                break
+            if number not in keep:
+                del self.levels[number]
+
+    def reset(self):
+        # Forget every level, e.g. before loading a save; running builds finish but are ignored
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.levels.clear()
+        self.diffs.clear()
+        self.items.clear()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
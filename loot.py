@@ -0,0 +1,125 @@
+import random
+from bisect import bisect_right
+
+import numpy as np
+
+
+DEFAULT_ASPECTS = ("aspect1", "aspect2")
+
+
+class LootTable:
+    # Compiled form of a {(min_level, max_level): (crystal_type, quantity[, aspects])} table.
+    # The level ranges are cut into non-overlapping intervals, each holding every drop whose
+    # range covers it, so a roll is one bisect instead of a scan over all ranges.
+    def __init__(self, table, levels=(1, 60), drop_chance=0.05):
+        self.levels = levels
+        self.drop_chance = drop_chance
+        ranges = []
+        for (min_level, max_level), drop in table.items():
+            crystal_type, quantity = drop[0], drop[1]
+            aspects = tuple(drop[2]) if len(drop) > 2 else DEFAULT_ASPECTS
+            ranges.append((min_level, max_level, (crystal_type, quantity, aspects)))
+
+        points = sorted({level for low, high, _ in ranges for level in (low, high + 1)})
+        self.bounds = points[:-1]  # Interval i covers [bounds[i], points[i + 1])
+        self.drops = [tuple(drop for low, high, drop in ranges if low <= start <= high) for start in self.bounds]
+        self.bounds_array = np.array(self.bounds, dtype=np.int64)
+        self.ends_array = np.array(points[1:], dtype=np.int64)
+
+    def drops_for_level(self, level):
+        index = bisect_right(self.bounds, level) - 1
+        if index < 0 or level >= self.ends_array[index]:
+            return ()
+        return self.drops[index]
+
+    def roll(self, rng=random):
+        # Drops for one destroyed block: a list of (crystal_type, quantity, aspects)
+        if rng.random() >= self.drop_chance:
+            return ()
+        return self.drops_for_level(rng.randint(*self.levels))
+
+    def roll_many(self, count, rng):
+        # Interval index per block for `count` blocks at once, -1 where nothing dropped.
+        # rng is a numpy Generator.
+        result = np.full(count, -1, dtype=np.int64)
+        hits = np.nonzero(rng.random(count) < self.drop_chance)[0]
+        if len(hits) and len(self.bounds):
+            levels = rng.integers(self.levels[0], self.levels[1] + 1, size=len(hits))
+            index = np.searchsorted(self.bounds_array, levels, side="right") - 1
+            valid = (index >= 0) & (levels < self.ends_array[np.maximum(index, 0)])
+            result[hits[valid]] = index[valid]
+        return result
+
+    def totals(self, rolled):
+        # Total crystals per (crystal_type, aspects) for the output of roll_many
+        counts = np.bincount(rolled[rolled >= 0], minlength=len(self.drops))
+        totals = {}
+        for index in np.nonzero(counts)[0]:
+            for crystal_type, quantity, aspects in self.drops[index]:
+                key = (crystal_type, aspects)
+                totals[key] = totals.get(key, 0) + quantity * int(counts[index])
+        return totals
+
+
+class AliasTable:
+    # Walker/Vose alias method: O(1) weighted choice after O(n) setup
+    def __init__(self, weights):
+        count = len(weights)
+        total = float(sum(weights))
+        scaled = [weight * count / total for weight in weights]
+        self.probability = [0.0] * count
+        self.alias = [0] * count
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            low = small.pop()
+            high = large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        for i in small + large:
+            self.probability[i] = 1.0
+        self.probability_array = np.array(self.probability)
+        self.alias_array = np.array(self.alias, dtype=np.int64)
+
+    def sample(self, rng=random):
+        column = rng.randrange(len(self.probability))
+        return column if rng.random() < self.probability[column] else self.alias[column]
+
+    def sample_many(self, count, rng):
+        columns = rng.integers(0, len(self.probability), size=count)
+        keep = rng.random(count) < self.probability_array[columns]
+        return np.where(keep, columns, self.alias_array[columns])
+
+
+class WeightedLootTable:
+    # Loot chosen by relative weight: [(weight, (crystal_type, quantity[, aspects])), ...]
+    def __init__(self, entries, drop_chance=0.05):
+        self.drop_chance = drop_chance
+        self.drops = []
+        for _, drop in entries:
+            aspects = tuple(drop[2]) if len(drop) > 2 else DEFAULT_ASPECTS
+            self.drops.append(((drop[0], drop[1], aspects),))
+        self.alias = AliasTable([weight for weight, _ in entries])
+
+    def roll(self, rng=random):
+        if rng.random() >= self.drop_chance:
+            return ()
+        return self.drops[self.alias.sample(rng)]
+
+    def roll_many(self, count, rng):
+        result = np.full(count, -1, dtype=np.int64)
+        hits = np.nonzero(rng.random(count) < self.drop_chance)[0]
+        result[hits] = self.alias.sample_many(len(hits), rng)
+        return result
+
+    totals = LootTable.totals
+
+
+def compile_loot_table(table):
+    # Compiled tables pass through; plain dicts are compiled now. Callers keep the result,
+    # so later edits to the dict need a new compile
+    if isinstance(table, (LootTable, WeightedLootTable)):
+        return table
+    return LootTable(table)
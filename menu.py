@@ -1,14 +1,19 @@
+from render import RenderPipeline
 from scene import Scene
 from settings import *
+from ui import CachedSurface, text_cache
 
 class MenuScene(Scene):
     def __init__(self, scene_manager):
         super().__init__()
         self.scene_manager = scene_manager  # Keep a reference to the scene manager
-        self.font = pygame.font.Font(None, 36)  # Default font for menu text
+        self.title = text_cache.render("Salt Mine", 36, (255, 255, 255))  # Rendered once
         self.buttons = self.create_buttons()
+        for button in self.buttons:
+            scene_manager.events.add_region(button.rect, {pygame.MOUSEBUTTONDOWN: button.click},
+                                            hover=button.set_hover, scope=self)
         self.image = loadim("Фон меню.png")
-        self.background_image = pygame.transform.scale( self.image , (800,800))
+        self.background_image = assets.scaled("Фон меню.png", (800, 800))
 
 
 
@@ -24,19 +29,23 @@ class MenuScene(Scene):
                              self.exit_game)
         return [new_game_button, continue_button, exit_button]
 
-    def draw(self, screen):
-        screen.blit(self.background_image, (0, 0))  # Draw background image
-
+    def collect_dirty(self, pipeline):
+        # The menu is static apart from button hover, so idle frames redraw nothing
         for button in self.buttons:
-            button.draw(screen)
+            pipeline.track(button, button.rect, button.hovering)
 
-        title_text = self.font.render("Salt Mine", True, (255, 255, 255))
-        title_rect = title_text.get_rect(center=(screen.get_width() // 2, 100))
-        screen.blit(title_text, title_rect)
+    def draw_layer(self, layer, screen):
+        if layer == "tiles":
+            screen.blit(self.background_image, (0, 0))  # Draw background image
+        elif layer == "ui":
+            for button in self.buttons:
+                button.draw(screen)
 
-    def handle_input(self, event):
-        for button in self.buttons:
-            button.handle_event(event)
+            screen.blit(self.title, self.title.get_rect(center=(screen.get_width() // 2, 100)))
+
+    def draw(self, screen):
+        for layer in RenderPipeline.LAYERS:
+            self.draw_layer(layer, screen)
 
     def start_new_game(self):
         # Initialize game data, create game objects, etc.
@@ -45,7 +54,9 @@ class MenuScene(Scene):
 
     def continue_game(self):
         # Load game data from save file
-        self.scene_manager.set_scene("game")  # Replace with your game scene loading logic
+        if not self.scene_manager.load_game():
+            print("No save found, starting a new game")
+            self.scene_manager.set_scene("game")
 
     def exit_game(self):
         pygame.quit()
@@ -66,19 +77,23 @@ class Button:
         self.onclick_function = onclick_function
         self.color = color
         self.text_color = text_color
-        self.font = pygame.font.Font(None, 36)  # Default menu font
         self.hovering = False
+        self.cache = CachedSurface(self.rect.size)
 
-    def draw(self, screen):
+    def compose(self, surface):
         color = (150, 150, 150) if self.hovering else self.color  # Hover effect
-        pygame.draw.rect(screen, color, self.rect)
-        text_surface = self.font.render(self.text, True, self.text_color)
-        text_rect = text_surface.get_rect(center=self.rect.center)
-        screen.blit(text_surface, text_rect)
-
-    def handle_event(self, event):
-        if event.type == pygame.MOUSEMOTION:
-            self.hovering = self.rect.collidepoint(event.pos)
-        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            if self.rect.collidepoint(event.pos):
-                self.onclick_function()
\ No newline at end of file
+        surface.fill(color)
+        text_surface = text_cache.render(self.text, 36, self.text_color)
+        surface.blit(text_surface, text_surface.get_rect(center=surface.get_rect().center))
+
+    def draw(self, screen):
+        screen.blit(self.cache.get(self.hovering, self.compose), self.rect)
+
+    def set_hover(self, hovering):
+        self.hovering = hovering
+
+    def click(self, event):
+        # Only reaches the button when the click is inside its rect
+        if event.button == 1:
+            self.onclick_function()
+            return True
\ No newline at end of file
@@ -0,0 +1,300 @@
+import heapq
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+
+SQRT2 = math.sqrt(2)
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def octile(x0, y0, x1, y1):
+    dx = abs(x0 - x1)
+    dy = abs(y0 - y1)
+    return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)
+
+
+class FlowField:
+    # Distance to one target tile for every tile within max_cost of it, from a single
+    # Dijkstra pass. Any number of agents read their next step from the same field.
+    def __init__(self, grid, target, max_cost):
+        self.grid = grid
+        self.target = target
+        self.max_cost = max_cost
+        self.cost = [math.inf] * (grid.width * grid.height)  # Row-major; a list indexes faster than an ndarray here
+        self.regions = set()  # Regions the field reached; a tile change there makes it stale
+        self.build()
+
+    def build(self):
+        grid = self.grid
+        width = grid.width
+        cost = self.cost
+        tx, ty = self.target
+        if not grid.walkable(tx, ty):
+            return
+        cost[ty * width + tx] = 0.0
+        queue = [(0.0, tx, ty)]
+        region_size = grid.region_size
+        can_step = grid.can_step
+        max_cost = self.max_cost
+        regions = self.regions
+        while queue:
+            distance, x, y = heapq.heappop(queue)
+            if distance > cost[y * width + x]:
+                continue
+            regions.add((x // region_size, y // region_size))
+            for dx, dy in DIRECTIONS:
+                if not can_step(x, y, dx, dy):
+                    # Walls the field stopped at count too: mining one opens new tiles to it
+                    regions.add(((x + dx) // region_size, (y + dy) // region_size))
+                    continue
+                new = distance + (SQRT2 if dx and dy else 1.0)
+                index = (y + dy) * width + x + dx
+                if new < cost[index] and new <= max_cost:
+                    cost[index] = new
+                    heapq.heappush(queue, (new, x + dx, y + dy))
+
+    def distance(self, x, y):
+        return self.cost[y * self.grid.width + x]
+
+    def next_tile(self, x, y):
+        # The neighbour that gets closest to the target, None at the target or out of reach
+        best = None
+        best_cost = self.distance(x, y)
+        for dx, dy in DIRECTIONS:
+            if self.grid.can_step(x, y, dx, dy):
+                value = self.distance(x + dx, y + dy)
+                if value < best_cost:
+                    best, best_cost = (x + dx, y + dy), value
+        return best
+
+
+class NavGrid:
+    # 8-connected grid graph over a level's PassabilityMap. Diagonal steps need both
+    # orthogonal neighbours open, so agents never cut wall corners.
+    # Paths come from A* with jump point search; paths and flow fields are cached and
+    # dropped when a tile in a region they cross changes.
+    def __init__(self, passability, region_size=16, cache_size=256):
+        self.passability = passability
+        self.width = passability.width
+        self.height = passability.height
+        bits = np.frombuffer(bytes(passability.bits), dtype=np.uint8).reshape(self.height, passability.stride)
+        blocked = np.unpackbits(bits, axis=1, bitorder="little")[:, :self.width]
+        self.open = bytearray((blocked == 0).astype(np.uint8).tobytes())  # 1 where walkable, row-major
+        self.region_size = region_size
+        self.versions = {}  # (region_x, region_y) -> number of tile changes
+        self.version = 0  # Total tile changes, for cached "no path" answers
+        self.cache_size = cache_size
+        self.paths = OrderedDict()  # (start, goal) -> (path, ((region, version), ...) or version)
+        self.fields = {}  # (target, max_cost) -> FlowField
+
+    def walkable(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height and self.open[y * self.width + x]
+
+    def can_step(self, x, y, dx, dy):
+        if not self.walkable(x + dx, y + dy):
+            return False
+        return not (dx and dy) or (self.walkable(x + dx, y) and self.walkable(x, y + dy))
+
+    def region(self, x, y):
+        return (x // self.region_size, y // self.region_size)
+
+    def tile_changed(self, x, y):
+        # Called after the level's tile (x, y) changed; refreshes the graph and stale caches
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        self.open[y * self.width + x] = not self.passability.blocked(x, y)
+        region = self.region(x, y)
+        self.versions[region] = self.versions.get(region, 0) + 1
+        self.version += 1
+        for key in [key for key, field in self.fields.items() if region in field.regions]:
+            del self.fields[key]
+
+    def area_changed(self, x0, y0, x1, y1):
+        # Like tile_changed for every tile in [x0, x1) x [y0, y1), e.g. a chunk generated after the grid was built
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width), min(y1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        blocked = self.passability.blocked
+        for y in range(y0, y1):
+            for x in range(x0, x1):
+                self.open[y * self.width + x] = not blocked(x, y)
+        size = self.region_size
+        regions = {(region_x, region_y) for region_y in range(y0 // size, (y1 - 1) // size + 1)
+                   for region_x in range(x0 // size, (x1 - 1) // size + 1)}
+        for region in regions:
+            self.versions[region] = self.versions.get(region, 0) + 1
+        self.version += 1
+        for key in [key for key, field in self.fields.items() if field.regions & regions]:
+            del self.fields[key]
+
+    # Flow fields
+
+    def flow_field(self, target, max_cost=48):
+        # Shared field toward target (a tile); rebuilt only after the target moves to
+        # another tile or the tiles it covers change
+        key = (tuple(target), max_cost)
+        field = self.fields.get(key)
+        if field is None:
+            field = self.fields[key] = FlowField(self, key[0], max_cost)
+            if len(self.fields) > 16:
+                del self.fields[next(iter(self.fields))]  # Oldest target
+        return field
+
+    # A* with jump point search
+
+    def find_path(self, start, goal):
+        # Tiles from start to goal inclusive, or None when unreachable
+        start = tuple(start)
+        goal = tuple(goal)
+        key = (start, goal)
+        entry = self.paths.get(key)
+        if entry is not None and self.still_valid(entry[1]):
+            self.paths.move_to_end(key)
+            return entry[0]
+        path = self.jump_point_search(start, goal)
+        if path is None:
+            stamp = self.version  # Any change anywhere might open a way
+        else:
+            regions = {self.region(x, y) for x, y in path}
+            stamp = tuple((region, self.versions.get(region, 0)) for region in regions)
+        self.paths[key] = (path, stamp)
+        self.paths.move_to_end(key)
+        if len(self.paths) > self.cache_size:
+            self.paths.popitem(last=False)
+        return path
+
+    def still_valid(self, stamp):
+        if isinstance(stamp, int):
+            return stamp == self.version
+        return all(self.versions.get(region, 0) == version for region, version in stamp)
+
+    def jump_point_search(self, start, goal):
+        if not self.walkable(*start) or not self.walkable(*goal):
+            return None
+        if start == goal:
+            return [start]
+        gx, gy = goal
+        open_heap = [(octile(*start, gx, gy), 0.0, start)]
+        cost = {start: 0.0}
+        parent = {start: None}
+        closed = set()
+        while open_heap:
+            _, distance, node = heapq.heappop(open_heap)
+            if node in closed:
+                continue
+            if node == goal:
+                return self.expand(node, parent)
+            closed.add(node)
+            for nx, ny in self.pruned_neighbours(node, parent[node]):
+                point = self.jump(nx, ny, node[0], node[1], goal)
+                if point is None or point in closed:
+                    continue
+                new = distance + octile(*node, *point)
+                if new < cost.get(point, math.inf):
+                    cost[point] = new
+                    parent[point] = node
+                    heapq.heappush(open_heap, (new + octile(*point, gx, gy), new, point))
+        return None
+
+    def pruned_neighbours(self, node, parent):
+        x, y = node
+        if parent is None:
+            return [(x + dx, y + dy) for dx, dy in DIRECTIONS if self.can_step(x, y, dx, dy)]
+        dx = (x > parent[0]) - (x < parent[0])
+        dy = (y > parent[1]) - (y < parent[1])
+        walkable = self.walkable
+        neighbours = []
+        if dx and dy:
+            if walkable(x, y + dy):
+                neighbours.append((x, y + dy))
+            if walkable(x + dx, y):
+                neighbours.append((x + dx, y))
+            if walkable(x, y + dy) and walkable(x + dx, y):
+                neighbours.append((x + dx, y + dy))
+        elif dx:
+            ahead = walkable(x + dx, y)
+            down = walkable(x, y + 1)
+            up = walkable(x, y - 1)
+            if ahead:
+                neighbours.append((x + dx, y))
+                if down:
+                    neighbours.append((x + dx, y + 1))
+                if up:
+                    neighbours.append((x + dx, y - 1))
+            if down:
+                neighbours.append((x, y + 1))
+            if up:
+                neighbours.append((x, y - 1))
+        else:
+            ahead = walkable(x, y + dy)
+            right = walkable(x + 1, y)
+            left = walkable(x - 1, y)
+            if ahead:
+                neighbours.append((x, y + dy))
+                if right:
+                    neighbours.append((x + 1, y + dy))
+                if left:
+                    neighbours.append((x - 1, y + dy))
+            if right:
+                neighbours.append((x + 1, y))
+            if left:
+                neighbours.append((x - 1, y))
+        return neighbours
+
+    def jump(self, x, y, px, py, goal):
+        # Next jump point from (px, py) through (x, y), or None. Iterative: straight runs
+        # across a big cavern would overflow the recursion limit.
+        dx = x - px
+        dy = y - py
+        walkable = self.walkable
+        while True:
+            if not walkable(x, y) or (dx and dy and not (walkable(x - dx, y) and walkable(x, y - dy))):
+                return None
+            if (x, y) == goal:
+                return (x, y)
+            if dx and dy:
+                if self.jump_straight(x + dx, y, dx, 0, goal) or self.jump_straight(x, y + dy, 0, dy, goal):
+                    return (x, y)
+            elif self.forced(x, y, dx, dy):
+                return (x, y)
+            x += dx
+            y += dy
+
+    def jump_straight(self, x, y, dx, dy, goal):
+        walkable = self.walkable
+        while walkable(x, y):
+            if (x, y) == goal or self.forced(x, y, dx, dy):
+                return True
+            x += dx
+            y += dy
+        return False
+
+    def forced(self, x, y, dx, dy):
+        # A straight move has a forced neighbour where a wall beside the previous tile ends
+        walkable = self.walkable
+        if dx:
+            return ((walkable(x, y - 1) and not walkable(x - dx, y - 1)) or
+                    (walkable(x, y + 1) and not walkable(x - dx, y + 1)))
+        return ((walkable(x - 1, y) and not walkable(x - 1, y - dy)) or
+                (walkable(x + 1, y) and not walkable(x + 1, y - dy)))
+
+    def expand(self, node, parent):
+        # Jump points back to a full tile-by-tile path
+        points = []
+        while node is not None:
+            points.append(node)
+            node = parent[node]
+        points.reverse()
+        path = [points[0]]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            dx = (x1 > x0) - (x1 < x0)
+            dy = (y1 > y0) - (y1 < y0)
+            x, y = x0, y0
+            while (x, y) != (x1, y1):
+                x += dx if x != x1 else 0
+                y += dy if y != y1 else 0
+                path.append((x, y))
+        return path
@@ -1,67 +1,92 @@
+from animation import Clip, load_sheet
+from collision import move_box
+from inventory import Container, stack_key
 from settings import *
+from ui import CachedSurface
 
-class Inventory:
-    def __init__(self, rows, cols, x, y, image):
-        self.rows = rows
-        self.cols = cols
-        self.slots = [[None for _ in range(cols)] for _ in range(rows)]  # 2D array for slots
+class Inventory(Container):
+    def __init__(self, rows, cols, x, y, image, stack_limit=99):
+        super().__init__(rows, cols, stack_limit)
         self.x = x
         self.y = y
         self.image = image
         self.slot_size = image.get_width() // cols  # Assuming square slots
         self.active_slot = (0, 0)  # Row, column tuple
         self.dragging_item = None
+        self.drag_origin = None  # Slot index the dragged stack came from
+        self.overflow = []  # Stacks that didn't fit back after a drag, dropped at the player's feet
         self.inventory_open = False #Flag to track inventory state.
+        self.cache = CachedSurface(image.get_size())
 
-    def add_item(self, item):
-        for r in range(self.rows):
-            for c in range(self.cols):
-                if self.slots[r][c] is None:
-                    self.slots[r][c] = item
-                    return
+    def compose(self, surface):
+        surface.blit(self.image, (0, 0))
+        for i, item in enumerate(self.slots):
+            if item:
+                r, c = divmod(i, self.cols)
+                item.draw(surface, c * self.slot_size, r * self.slot_size)
 
     def draw(self, screen):
         if self.inventory_open: # Only draw if open
-            screen.blit(self.image, (self.x, self.y))
-            for r in range(self.rows):
-                for c in range(self.cols):
-                    item = self.slots[r][c]
-                    if item:
-                        item.draw(screen, self.x + c * self.slot_size, self.y + r * self.slot_size)
+            # Recomposed only when the contents change (adds, removes, drags)
+            screen.blit(self.cache.get(self.version, self.compose), (self.x, self.y))
 
     def open_inventory(self):
         self.inventory_open =  not self.inventory_open
 
     def open_chest(self, chest):
-        print(f"Chest opened. Contains: {chest.contents}") # Placeholder - needs chest implementation
-
+        # Takes everything that fits in one transfer; the rest stays in the chest
+        left = chest.transfer(self)
+        if left:
+            print(f"Inventory full. Left in chest: {[(stack.name, stack.count) for stack in left]}")
+        return left
+
+    def slot_at(self, pos):
+        mouse_x, mouse_y = pos
+        grid_x = (mouse_x - self.x) // self.slot_size
+        grid_y = (mouse_y - self.y) // self.slot_size
+        if 0 <= grid_x < self.cols and 0 <= grid_y < self.rows and self.inventory_open:
+            return grid_y * self.cols + grid_x
+        return None
 
     def drag_and_drop(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            mouse_x, mouse_y = event.pos
-            grid_x = (mouse_x - self.x) // self.slot_size
-            grid_y = (mouse_y - self.y) // self.slot_size
-
-            if 0 <= grid_x < self.cols and 0 <= grid_y < self.rows and self.inventory_open:
-                item = self.slots[grid_y][grid_x]
-                if item:
-                    self.dragging_item = item
-                    self.slots[grid_y][grid_x] = None
+            i = self.slot_at(event.pos)
+            if i is not None and self.slots[i]:
+                self.dragging_item = self.take_slot(i)
+                self.drag_origin = i
 
         elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
             if self.dragging_item:
-                mouse_x, mouse_y = event.pos
-                grid_x = (mouse_x - self.x) // self.slot_size
-                grid_y = (mouse_y - self.y) // self.slot_size
-
-                if 0 <= grid_x < self.cols and 0 <= grid_y < self.rows and self.inventory_open:
-                    if self.slots[grid_y][grid_x] is None:
-                        self.slots[grid_y][grid_x] = self.dragging_item
+                stack = self.dragging_item
+                i = self.slot_at(event.pos)
+                target = self.slots[i] if i is not None else None
+                if i is None:
+                    self.put_back(stack)  # Dropped outside the grid
+                elif target and stack_key(target) == stack_key(stack):
+                    # Same item: merge into the target, anything over the limit goes back
+                    moved = min(self.stack_limit - target.count, stack.count)
+                    self._resize(i, target.count + moved)
+                    stack.count -= moved
+                    if stack.count:
+                        self.put_back(stack)
                     else:
-                        temp = self.slots[grid_y][grid_x]
-                        self.slots[grid_y][grid_x] = self.dragging_item
-                        self.dragging_item = temp
+                        self.version += 1
+                else:
+                    self.put_back(self.set_slot(i, stack))  # Swap whatever was there into the origin
                 self.dragging_item = None
+                self.drag_origin = None
+
+    def put_back(self, stack):
+        # The origin slot may have been filled mid-drag (e.g. by a pickup); then the stack
+        # is added like any other, and what doesn't fit goes to overflow
+        if stack is None:
+            return
+        if self.slots[self.drag_origin] is None:
+            self.set_slot(self.drag_origin, stack)
+            return
+        left = self.add(stack)
+        if left:
+            self.overflow.append(self.copy_stack(stack, left))
 
 
 class Hotbar:
@@ -72,17 +97,25 @@ class Hotbar:
         self.image = image
         self.active_slot = 0
         self.slot_size = image.get_width() // 12 # Assuming 12 slots
+        self.cache = CachedSurface(image.get_size())
 
-    def draw(self, screen):
-        screen.blit(self.image, (self.x, self.y))
+    def compose(self, surface):
+        surface.blit(self.image, (0, 0))
         for i in range(12):
-            item = self.inventory.slots[0][i]
+            item = self.inventory.slots[i]  # First row of the inventory
             if item:
-                item.draw(screen, self.x + i * self.slot_size, self.y)
+                item.draw(surface, i * self.slot_size, 0)
+        selected = pygame.Rect(self.active_slot * self.slot_size, 0, self.slot_size, self.slot_size)
+        pygame.draw.rect(surface, (255, 255, 255), selected, 3)  # Selection highlight
 
-    def update(self, event):
-        if event.type == pygame.MOUSEWHEEL:
-            self.active_slot = (self.active_slot + event.y) % 12
+    def state(self):
+        return (self.active_slot, self.inventory.version)
+
+    def draw(self, screen):
+        screen.blit(self.cache.get(self.state(), self.compose), (self.x, self.y))
+
+    def scroll(self, event):
+        self.active_slot = (self.active_slot + event.y) % 12
 
 
 class Player(pygame.sprite.Sprite):
@@ -93,8 +126,10 @@ class Player(pygame.sprite.Sprite):
     SWITCHING_STATE = 3
     PICKING_UP_STATE = 4
 
-    WALK_SPEED = 3
-    RUN_SPEED = 6
+    WALK_SPEED = 180  # Pixels per second
+    RUN_SPEED = 360
+
+    ANIMATION_FPS = 60  # Animation tables below give frame durations in 1/60 s ticks
 
     NO_ITEM = -1
     ROCK_ITEM = 0
@@ -112,6 +147,7 @@ class Player(pygame.sprite.Sprite):
     TOOL_OFFSET = (-40, -50)
     ITEM_OFFSET = (-18, -40)
     TILE_SIZE = 32
+    HITBOX = (34, 68, 28, 28)  # Feet area of the 100x100 frame, relative to pos_x/pos_y
 
     # Tool consts
     HOE = 0
@@ -128,20 +164,21 @@ class Player(pygame.sprite.Sprite):
     item_frame_rect = pygame.Rect(0, 0, ITEM_FRAME_SIZE[0], ITEM_FRAME_SIZE[1])
     item_screen_rect = pygame.Rect(0, 0, ITEM_FRAME_SIZE[0], ITEM_FRAME_SIZE[1])
 
-    # Animations
-    IDLE_ANIMATION = [(0, 60)]
-    WALK_ANIMATION = [(1, 10), (0, 10), (2, 10), (0, 10)]
-    RUN_ANIMATION = [(3, 8), (0, 8), (4, 8), (0, 8)]
+    # Animations, compiled once and shared by every player; durations in 1/60 s ticks
+    IDLE_ANIMATION = Clip([(0, 60)], ANIMATION_FPS)
+    WALK_ANIMATION = Clip([(1, 10), (0, 10), (2, 10), (0, 10)], ANIMATION_FPS)
+    RUN_ANIMATION = Clip([(3, 8), (0, 8), (4, 8), (0, 8)], ANIMATION_FPS)
 
-    PICKUP_ANIMATION = [(5, 10)]
-    HOLD_ANIMATION = [(6, 60)]
-    HOLD_WALK_ANIMATION = [(6, 10), (7, 10), (6, 10), (8, 10)]
-    HOLD_RUN_ANIMATION = [(6, 8), (9, 8), (6, 8), (10, 8)]
+    PICKUP_ANIMATION = Clip([(5, 10)], ANIMATION_FPS)
+    HOLD_ANIMATION = Clip([(6, 60)], ANIMATION_FPS)
+    HOLD_WALK_ANIMATION = Clip([(6, 10), (7, 10), (6, 10), (8, 10)], ANIMATION_FPS)
+    HOLD_RUN_ANIMATION = Clip([(6, 8), (9, 8), (6, 8), (10, 8)], ANIMATION_FPS)
 
-    TILLING_ANIMATION = [(12, 15), (13, 4), (14, 8), (15, 30)]
-    WATER_ANIMATION = [(16, 15), (17, 30), (16, 7)]
-    SOW_ANIMATION = [(18, 10), (19, 10), (20, 10), (21, 10), (22, 30)]
-    TOOL_SWITCH_ANIMATION = [(11, 45)]
+    TILLING_ANIMATION = Clip([(12, 15), (13, 4), (14, 8), (15, 30)], ANIMATION_FPS)
+    WATER_ANIMATION = Clip([(16, 15), (17, 30), (16, 7)], ANIMATION_FPS)
+    SOW_ANIMATION = Clip([(18, 10), (19, 10), (20, 10), (21, 10), (22, 30)], ANIMATION_FPS)
+    TOOL_SWITCH_ANIMATION = Clip([(11, 45)], ANIMATION_FPS)
+    FRAME_COLUMNS = 23  # Highest column any clip above uses, plus one
 
     TILLING_FRAME = 14
     WATERING_FRAME = 17
@@ -156,6 +193,8 @@ class Player(pygame.sprite.Sprite):
 
     pos_x = 100
     pos_y = 100
+    prev_x = 100  # Position at the previous simulation tick, for interpolated rendering
+    prev_y = 100
 
     current_state = IDLE_STATE
     current_direction = DOWN
@@ -163,8 +202,7 @@ class Player(pygame.sprite.Sprite):
     current_frame = 0
     current_animation = None
 
-    frame_counter = 0
-    current_duration = 0
+    frame_timer = 0.0
     animation_index = 0
 
     tile_x = 0
@@ -173,11 +211,11 @@ class Player(pygame.sprite.Sprite):
     reticle_y = 0
 
     running = False
+    passability = None  # Collision mask of the level the player is on, set by the scene
 
     screen_rect = None
-    frame_rect = None
 
-    spritesheet = None
+    sheet = None
     tool_sheet = None
     item_sheet = None
 
@@ -185,65 +223,72 @@ class Player(pygame.sprite.Sprite):
         pygame.sprite.Sprite.__init__(self)
         self.game = game
         self.scene = scene
-        self.spritesheet = loadim("farmer-big.png")
-        if self.spritesheet is None:
+        self.key_source = pygame.key.get_pressed  # Swapped out for scripted input in bench.py
+        self.sheet = load_sheet("farmer-big.png", self.FRAME_SIZE)  # Sliced once, shared with other players/NPCs
+        if assets.is_missing("farmer-big.png"):
             print("Error: Could not load farmer-big.png")
             pygame.quit()
             quit()
+        self.sheet.require(self.FRAME_COLUMNS, "farmer-big.png")
 
-        self.frame_rect = pygame.Rect(0, 0, self.FRAME_SIZE[0], self.FRAME_SIZE[1])
-        self.image = self.spritesheet.subsurface(self.frame_rect)
+        self.image = self.sheet.frame(self.current_direction, 0)
         self.rect = self.image.get_rect()
         self.rect.topleft = (self.pos_x, self.pos_y)
         self.set_animation(self.IDLE_ANIMATION)
         self.inventory = Inventory(3, 12, 500, 500, loadim("inventory.png"))
         self.hotbar = Hotbar(self.inventory, 10, 20,
-                             pygame.transform.scale(loadim("Хотбар. Увелич обводка.png"), (700, 200)))
+                             assets.scaled("Хотбар. Увелич обводка.png", (700, 200)))
         # Added for error handling
         self.item_sheet = loadim("items.png")  # Replace with your item spritesheet
-        if self.item_sheet is None:
+        if assets.is_missing("items.png"):
             print("Error: Could not load items.png")
             pygame.quit()
             quit()
         self.tool_sheet = loadim("tools.png")  # Replace with your tool spritesheet
-        if self.tool_sheet is None:
+        if assets.is_missing("tools.png"):
             print("Error: Could not load tools.png")
             pygame.quit()
             quit()
 
         self.screen_rect = self.rect.copy()
 
+        # The player lives across scenes, so its handlers are unscoped
+        events = game.events
+        events.subscribe(pygame.MOUSEWHEEL, self.hotbar.scroll)
+        inventory_rect = self.inventory.image.get_rect(topleft=(self.inventory.x, self.inventory.y))
+        events.add_region(inventory_rect, {pygame.MOUSEBUTTONDOWN: self.inventory.drag_and_drop})
+        events.subscribe(pygame.MOUSEBUTTONUP, self.inventory.drag_and_drop)  # Drops may land outside the grid
+
 
 
     def set_frame(self, frame):
         self.current_frame = frame
-        cur_row = self.current_direction
-        cur_col = self.current_frame
-
-        self.frame_rect.topleft = (cur_col * self.FRAME_SIZE[0], cur_row * self.FRAME_SIZE[1])
+        self.image = self.sheet.frames[self.current_direction][frame]
 
     def next_frame(self):
-        self.current_frame = self.current_animation[self.animation_index][0]
-        self.current_duration = self.current_animation[self.animation_index][1]
+        self.current_frame = self.current_animation.columns[self.animation_index]
         self.on_frame()
 
     def set_animation(self, animation):
         self.current_animation = animation
         self.animation_index = 0
 
-        self.frame_counter = 0
+        self.frame_timer = 0.0
         self.next_frame()
         self.set_frame(self.current_frame)
 
-    def update_animation(self):
-        self.frame_counter += 1
+    def update_animation(self, dt):
+        self.frame_timer += dt
+        clip = self.current_animation
 
-        if self.frame_counter >= self.current_duration:
-            self.frame_counter = 0
+        while self.frame_timer >= clip.ends[self.animation_index]:
             self.animation_index += 1
-            if self.animation_index >= len(self.current_animation):
+            if self.animation_index >= len(clip):
                 self.animation_index = 0
+                self.frame_timer -= clip.duration
                 self.on_animation_end()
+                if self.current_animation is not clip:
+                    return  # set_animation already showed the new clip's first frame
             self.next_frame()
             self.set_frame(self.current_frame)
 
@@ -267,13 +312,31 @@ class Player(pygame.sprite.Sprite):
         if item and hasattr(item, 'use'):  # Check if the item has a 'use' method
             item.use(screen)  # Call the item's use method
 
-    def pick_up_item(self, item, distance_threshold=20):
-        distance_sq = (self.rect.centerx - item.rect.centerx) ** 2 + (self.rect.centery - item.rect.centery) ** 2
-        if distance_sq <= distance_threshold ** 2:
-            self.inventory.add_item(item)
-            item.kill()  # Remove from sprite groups
-
-    def move(self, direction):
+    def pick_up_nearby(self, distance_threshold=20):
+        # One vectorized distance test over the item store, then one inventory add per item type
+        world_items = self.game.world_items
+        if not world_items:
+            return 0
+        ox, oy, width, height = self.HITBOX
+        nearby = world_items.within((self.pos_x + ox + width / 2, self.pos_y + oy + height / 2), distance_threshold)
+        taken = []
+        for type_id, indices in world_items.by_type(nearby).items():
+            left = self.inventory.add(world_items.to_stack(type_id, len(indices)))
+            taken.extend(indices[:len(indices) - left].tolist())  # Whatever did not fit stays on the ground
+        world_items.remove(taken)
+        return len(taken)
+
+    def drop_overflow(self):
+        # Stacks that no longer fit in the inventory land at the player's feet
+        world_items = self.game.world_items
+        if world_items is None:
+            return  # Kept until the player is back on a level
+        ox, oy, width, height = self.HITBOX
+        for stack in self.inventory.overflow:
+            world_items.spawn_stack(stack, self.pos_x + ox + width / 2, self.pos_y + oy + height / 2)
+        self.inventory.overflow.clear()
+
+    def move(self, direction, dt):
         if self.current_state != self.IDLE_STATE and self.current_state != self.MOVING_STATE:
             return
 
@@ -290,34 +353,31 @@ class Player(pygame.sprite.Sprite):
                     self.set_animation(self.WALK_ANIMATION)
             self.current_state = self.MOVING_STATE
 
-        if self.running == True:
-            if direction == self.DOWN:
-                self.pos_y += self.RUN_SPEED
-                self.current_direction = self.DOWN
-            if direction == self.UP:
-                self.pos_y -= self.RUN_SPEED
-                self.current_direction = self.UP
-            if direction == self.LEFT:
-                self.pos_x -= self.RUN_SPEED
-                self.current_direction = self.LEFT
-            if direction == self.RIGHT:
-                self.pos_x += self.RUN_SPEED
-                self.current_direction = self.RIGHT
-        else:
-            if direction == self.DOWN:
-                self.pos_y += self.WALK_SPEED
-                self.current_direction = self.DOWN
-            if direction == self.UP:
-                self.pos_y -= self.WALK_SPEED
-                self.current_direction = self.UP
-            if direction == self.LEFT:
-                self.pos_x -= self.WALK_SPEED
-                self.current_direction = self.LEFT
-            if direction == self.RIGHT:
-                self.pos_x += self.WALK_SPEED
-                self.current_direction = self.RIGHT
+        speed = self.RUN_SPEED if self.running else self.WALK_SPEED
+        if direction != self.current_direction:
+            self.current_direction = direction
+            self.set_frame(self.current_frame)  # Same frame, the new direction's row
+        if direction == self.DOWN:
+            self.step(0, speed * dt)
+        elif direction == self.UP:
+            self.step(0, -speed * dt)
+        elif direction == self.LEFT:
+            self.step(-speed * dt, 0)
+        elif direction == self.RIGHT:
+            self.step(speed * dt, 0)
         self.screen_rect.center = (self.pos_x, self.pos_y)
 
+    def step(self, dx, dy):
+        # Moves the feet hitbox through the tile grid; only the tiles it sweeps over are checked
+        if self.passability is None:
+            self.pos_x += dx
+            self.pos_y += dy
+            return
+        ox, oy, width, height = self.HITBOX
+        x, y = move_box(self.passability, self.TILE_SIZE, (self.pos_x + ox, self.pos_y + oy, width, height), dx, dy)
+        self.pos_x = x - ox
+        self.pos_y = y - oy
+
     def stop_move(self):
         if self.current_state == self.MOVING_STATE:
             self.current_state = self.IDLE_STATE
@@ -351,28 +411,55 @@ class Player(pygame.sprite.Sprite):
     def update_held_item_rect(self):
         self.item_screen_rect.topleft = (self.pos_x + self.ITEM_OFFSET[0], self.pos_y + self.ITEM_OFFSET[1])
 
-    def update(self):  # Removed dt
-        keys = pygame.key.get_pressed()
+    def update(self, dt=1 / 60):  # dt is one fixed simulation tick
+        self.prev_x = self.pos_x
+        self.prev_y = self.pos_y
+        keys = self.key_source()
         self.running = keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]  # simplified running logic
 
         if keys[pygame.K_s]:
-            self.move(self.DOWN)
+            self.move(self.DOWN, dt)
         if keys[pygame.K_w]:
-            self.move(self.UP)
+            self.move(self.UP, dt)
         if keys[pygame.K_a]:
-            self.move(self.LEFT)
+            self.move(self.LEFT, dt)
         if keys[pygame.K_d]:
-            self.move(self.RIGHT)
+            self.move(self.RIGHT, dt)
         if keys[pygame.K_e]:
             self.inventory.open_inventory()
         if not (keys[pygame.K_s] or keys[pygame.K_w] or keys[pygame.K_a] or keys[pygame.K_d]):
             self.stop_move()
 
-        self.update_animation()
-        self.rect.topleft = (self.pos_x, self.pos_y)  # Update rect position
-
-    def run(self, event):
-        self.hotbar.update(event)
+        if self.inventory.overflow:
+            self.drop_overflow()
+        self.pick_up_nearby()  # Walking over dropped items collects them
+        self.update_animation(dt)
+        self.rect.topleft = (round(self.pos_x), round(self.pos_y))  # Update rect position
+
+    def place(self, x, y):
+        # Teleport without interpolating from the old position
+        self.pos_x = self.prev_x = x
+        self.pos_y = self.prev_y = y
+        self.rect.topleft = (round(x), round(y))
+
+    def interpolated_rect(self, alpha):
+        # Where to draw between the previous and the current tick
+        return pygame.Rect((round(self.prev_x + (self.pos_x - self.prev_x) * alpha),
+                            round(self.prev_y + (self.pos_y - self.prev_y) * alpha)), self.rect.size)
+
+    def track_ui(self, pipeline):
+        # Hotbar and inventory only repaint when their contents or selection change
+        hotbar = self.hotbar
+        pipeline.track(hotbar, hotbar.image.get_rect(topleft=(hotbar.x, hotbar.y)),
+                       hotbar.state())
+        inventory = self.inventory
+        if inventory.inventory_open:
+            pipeline.track(inventory, inventory.image.get_rect(topleft=(inventory.x, inventory.y)),
+                           inventory.version)
+
+    def draw_ui(self, screen):
+        self.inventory.draw(screen)
+        self.hotbar.draw(screen)
 
     def draw(self, screen):  #Takes screen as argument
         self.inventory.draw(screen)
@@ -0,0 +1,127 @@
+import csv
+import json
+import time
+from array import array
+
+import pygame
+
+from ui import text_cache
+
+
+class FrameProfiler:
+    # Per-phase frame timings in fixed-size ring buffers.
+    # Call begin_frame(), then mark(phase) as each phase finishes, then end_frame().
+    PHASES = ("events", "input", "update", "draw", "flip")
+
+    def __init__(self, capacity=600, phases=PHASES):
+        self.capacity = capacity
+        self.phases = phases
+        self.timings = {phase: array("d", bytes(8 * capacity)) for phase in phases}
+        self.totals = array("d", bytes(8 * capacity))
+        self.frame_numbers = array("q", bytes(8 * capacity))
+        self.current = dict.fromkeys(phases, 0.0)
+        self.frame = 0  # Frames recorded so far, the ring slot is frame % capacity
+        self.sprite_counts = {}
+        self._frame_start = self._last_mark = 0.0
+
+    def begin_frame(self):
+        self._frame_start = self._last_mark = time.perf_counter()
+        for phase in self.phases:
+            self.current[phase] = 0.0
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[phase] += now - self._last_mark
+        self._last_mark = now
+
+    def end_frame(self, sprite_counts=None):
+        slot = self.frame % self.capacity
+        for phase in self.phases:
+            self.timings[phase][slot] = self.current[phase]
+        self.totals[slot] = self._last_mark - self._frame_start
+        self.frame_numbers[slot] = self.frame
+        self.frame += 1
+        if sprite_counts is not None:
+            self.sprite_counts = sprite_counts
+
+    def __len__(self):
+        return min(self.frame, self.capacity)
+
+    def slots(self):
+        # Ring slots from oldest to newest
+        count = len(self)
+        first = self.frame - count
+        return [(first + i) % self.capacity for i in range(count)]
+
+    def recent_totals(self, count):
+        return [self.totals[slot] for slot in self.slots()[-count:]]
+
+    def averages(self):
+        slots = self.slots()
+        if not slots:
+            return dict.fromkeys(self.phases, 0.0)
+        return {phase: sum(self.timings[phase][slot] for slot in slots) / len(slots) for phase in self.phases}
+
+    def slowest_phase(self):
+        averages = self.averages()
+        return max(averages, key=averages.get)
+
+    def rows(self):
+        for slot in self.slots():
+            row = {"frame": self.frame_numbers[slot], "total_ms": self.totals[slot] * 1000}
+            for phase in self.phases:
+                row[f"{phase}_ms"] = self.timings[phase][slot] * 1000
+            yield row
+
+    def export(self, path):
+        # Writes the buffered frames as CSV or JSON depending on the file extension
+        rows = list(self.rows())
+        if path.endswith(".json"):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({"frames": rows, "sprite_counts": self.sprite_counts}, file, indent=1)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=["frame", "total_ms"] + [f"{p}_ms" for p in self.phases])
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"Frame trace written to {path}")
+
+
+class ProfilerOverlay:
+    # Frame-time graph, slowest phase and sprite counts, drawn over the game
+    def __init__(self, profiler, x=10, y=10, width=340, height=150):
+        self.profiler = profiler
+        self.rect = pygame.Rect(x, y, width, height)
+        self.visible = False
+        self.font = None
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, screen):
+        if self.font is None:
+            self.font = text_cache.font(None, 18)  # Shared with the rest of the UI
+        screen.fill((0, 0, 0), self.rect)
+        graph = pygame.Rect(self.rect.x + 5, self.rect.y + 5, self.rect.width - 10, 60)
+
+        # Bars of the last frames, scaled so the 60 FPS budget sits at mid height
+        budget = 1 / 60
+        totals = self.profiler.recent_totals(graph.width // 2)
+        for i, total in enumerate(totals):
+            height = min(int(total / budget * graph.height / 2), graph.height)
+            color = (80, 200, 80) if total <= budget else (220, 70, 70)
+            screen.fill(color, (graph.x + i * 2, graph.bottom - height, 2, height))
+        pygame.draw.line(screen, (200, 200, 200), (graph.x, graph.centery), (graph.right, graph.centery))
+
+        averages = self.profiler.averages()
+        average_total = sum(averages.values())
+        lines = [f"frame {average_total * 1000:.2f} ms  slowest: {self.profiler.slowest_phase()}",
+                 "  ".join(f"{phase} {ms * 1000:.1f}" for phase, ms in averages.items())]
+        lines += [f"{name}: {count}" for name, count in self.profiler.sprite_counts.items()]
+        y = graph.bottom + 4
+        for line in lines:
+            if y + 14 > self.rect.bottom:
+                break
+            screen.blit(self.font.render(line, True, (255, 255, 255)), (self.rect.x + 5, y))
+            y += 14
+        return self.rect
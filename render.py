@@ -0,0 +1,68 @@
+import pygame
+
+
+class RenderPipeline:
+    # Draws a scene layer by layer and only inside the screen areas that changed.
+    # Scenes report changes from collect_dirty(pipeline) either directly with
+    # invalidate(rect) or through track(key, rect, state), which compares against
+    # the previous frame and dirties the old and new rects when anything moved.
+    LAYERS = ("tiles", "world", "player", "ui")
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.dirty = []
+        self.full_redraw = True
+        self.tracked = {}  # key -> (rect, state) as of the last frame
+        self.seen = set()
+        self.alpha = 1.0  # Fraction of a simulation tick since the last update, for interpolation
+
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty.append(pygame.Rect(rect))
+
+    def track(self, key, rect, state=None):
+        self.seen.add(key)
+        previous = self.tracked.get(key)
+        current = (pygame.Rect(rect), state)
+        if previous != current:
+            if previous:
+                self.dirty.append(previous[0])
+            self.dirty.append(current[0])
+            self.tracked[key] = current
+
+    def end_tracking(self):
+        # Anything tracked last frame but not this one has disappeared, clear where it was
+        for key in [key for key in self.tracked if key not in self.seen]:
+            self.dirty.append(self.tracked.pop(key)[0])
+        self.seen.clear()
+
+    def reset(self):
+        self.tracked.clear()
+        self.seen.clear()
+        self.dirty.clear()
+        self.full_redraw = True
+
+    def render(self, scene, alpha=1.0):
+        self.alpha = alpha
+        scene.collect_dirty(self)
+        self.end_tracking()
+
+        screen_rect = self.screen.get_rect()
+        if self.full_redraw:
+            rects = [screen_rect]
+        else:
+            rects = [rect.clip(screen_rect) for rect in self.dirty]
+            rects = [rect for rect in rects if rect.width and rect.height]
+        self.dirty = []
+        self.full_redraw = False
+        if not rects:
+            return []
+
+        # One pass over the layers, clipped to the area that changed, so every sprite is drawn once
+        self.screen.set_clip(rects[0].unionall(rects[1:]))
+        for layer in self.LAYERS:
+            scene.draw_layer(layer, self.screen)
+        self.screen.set_clip(None)
+        return rects
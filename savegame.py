@@ -0,0 +1,510 @@
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Object import Crystal, CrystalPile, Item, ItemStack
+from entities import WorldItems
+from growth import visible_stage
+from levels import LevelDiff
+from settings import *
+
+
+# Save file layout, little-endian:
+#   header     "SALTSAVE" + format version (u16)
+#   sections   raw section bodies, appended by incremental saves
+#   directory  section count (u32), then per section: kind (u8), scene name, key (i32), offset, length (u64)
+#   footer     "SALTEND\0" + directory offset (u64) + bytes used by live sections (u64)
+# Every save appends the sections that changed plus a new directory and footer; the
+# previous directory's entries for unchanged sections are reused as they are. When dead
+# space outweighs live data the file is rewritten from scratch.
+# The footer is written (and synced) last, and loading uses the last intact footer, so
+# an append cut short by a crash or a full disk falls back to the previous save.
+
+MAGIC = b"SALTSAVE"
+END_MAGIC = b"SALTEND\0"
+FORMAT_VERSION = 3  # 2: ground items stored per type as position arrays, 3: ground items per level
+HEADER = struct.Struct("<8sH")
+FOOTER = struct.Struct("<8sQQ")
+ENTRY = struct.Struct("<iQQ")
+
+META = 0  # Global: current scene, farm day
+SCENE = 1  # Per cave scene: world seed, current level, tile names
+PLAYER = 2
+INVENTORY = 3
+GROUND = 4  # Items lying on one (scene, level number)
+GROWTH = 5  # Crystal piles and their growth
+LEVEL = 6  # One LevelDiff per (scene, level number)
+
+ITEM_KINDS = {cls.__name__: cls for cls in (Item, Crystal)}
+
+
+class Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def pack(self, fmt, *values):
+        self.data += struct.pack("<" + fmt, *values)
+
+    def string(self, text):
+        encoded = (text or "").encode("utf-8")
+        self.pack("H", len(encoded))
+        self.data += encoded
+
+    def strings(self, texts):
+        self.pack("H", len(texts))
+        for text in texts:
+            self.string(text)
+
+    def image(self, surface):
+        self.string(assets.name_of(surface))  # Empty for the placeholder
+
+    def bytes(self):
+        return bytes(self.data)
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values if len(values) > 1 else values[0]
+
+    def string(self):
+        length = self.unpack("H")
+        text = bytes(self.data[self.offset:self.offset + length]).decode("utf-8")
+        self.offset += length
+        return text
+
+    def strings(self):
+        return [self.string() for _ in range(self.unpack("H"))]
+
+    def image(self):
+        name = self.string()
+        return loadim(name) if name else assets.placeholder
+
+
+class SaveFile:
+    # A save opened through mmap. Only the directory is parsed up front; sections are
+    # decoded when asked for, so levels the player never revisits cost nothing.
+    def __init__(self, path):
+        self.path = path
+        self.handle = open(path, "rb")
+        self.map = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} save")
+        self.sections = {}  # (kind, scene name, key) -> (offset, length)
+        self.size = self.find_footer()  # End of the last complete save; anything after it is a torn append
+        if self.size is None:
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    def find_footer(self):
+        end = len(self.map)
+        while True:
+            start = self.map.rfind(END_MAGIC, HEADER.size, end)
+            if start < 0:
+                return None
+            if self.read_directory(start):
+                return start + FOOTER.size
+            end = start + len(END_MAGIC) - 1
+
+    def read_directory(self, footer):
+        # True when the footer at this offset and the directory it points to are intact
+        if footer + FOOTER.size > len(self.map):
+            return False
+        _, directory, live = FOOTER.unpack_from(self.map, footer)
+        if not HEADER.size <= directory < footer:
+            return False
+        sections = {}
+        reader = Reader(self.map)
+        reader.offset = directory
+        try:
+            for _ in range(reader.unpack("I")):
+                kind = reader.unpack("B")
+                scene = reader.string()
+                key, offset, length = reader.unpack("iQQ")
+                if offset + length > directory:
+                    return False
+                sections[(kind, scene, key)] = (offset, length)
+        except (struct.error, UnicodeDecodeError):
+            return False
+        if reader.offset != footer:
+            return False
+        self.sections = sections
+        self.live_bytes = live
+        return True
+
+    def section(self, kind, scene="", key=0):
+        entry = self.sections.get((kind, scene, key))
+        if entry is None:
+            return None
+        offset, length = entry
+        return memoryview(self.map)[offset:offset + length]
+
+    def reader(self, kind, scene="", key=0):
+        data = self.section(kind, scene, key)
+        return None if data is None else Reader(data)
+
+    def level_diff(self, scene, number):
+        reader = self.reader(LEVEL, scene, number)
+        if reader is None:
+            return None
+        width, count = reader.unpack("II")
+        diff = LevelDiff(width)
+        start = reader.offset
+        diff.cells.frombytes(reader.data[start:start + count * 4])
+        diff.tile_ids.frombytes(reader.data[start + count * 4:start + count * 5])
+        return diff
+
+    def close(self):
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # A memoryview still points into it; it is freed with the view
+            self.map = None
+        self.handle.close()
+
+
+def open_save(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        return SaveFile(path)
+    except (ValueError, struct.error, OSError) as e:
+        print(f"Error loading save {path}: {e}")
+        return None
+
+
+class SaveManager:
+    # Snapshots the game on the main thread (a few bytes per changed section) and writes
+    # the file on a background thread. Level and ground sections are only written when their
+    # diff or items changed since the last save; every other level keeps its old bytes in the file.
+    def __init__(self, path, compact_ratio=2.0, slack=1 << 20):
+        self.path = path
+        self.compact_ratio = compact_ratio  # Rewrite the file when it is this much bigger than its live data
+        self.slack = slack  # Bytes of dead space always tolerated, so small saves keep appending
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+        self.pending = None  # Future of the write in progress
+        self.file = None  # SaveFile this session's saves extend; None starts a fresh file
+        self.saved = {}  # LEVEL/GROUND section key -> LevelDiff/WorldItems version in the file
+        self.written = {}  # Section key -> bytes in the file, for the small always-snapshotted sections
+
+    def cave_scenes(self, scene_manager):
+        return [(name, scene) for name, scene in scene_manager.scenes.items() if hasattr(scene, "levels")]
+
+    # Snapshot, main thread
+
+    def snapshot(self, scene_manager):
+        sections = {}
+        writer = Writer()
+        current = scene_manager.current_scene
+        current_name = next((name for name, scene in scene_manager.scenes.items() if scene is current), "")
+        writer.string(current_name)
+        writer.pack("I", scene_manager.crystal_farm.day)
+        sections[(META, "", 0)] = writer.bytes()
+
+        versions = {}
+        for name, scene in self.cave_scenes(scene_manager):
+            writer = Writer()
+            writer.pack("QI", scene.world_seed, scene.current_level)
+            writer.strings(scene.tiles.names)
+            sections[(SCENE, name, 0)] = writer.bytes()
+            for number, diff in scene.levels.diffs.items():
+                key = (LEVEL, name, number)
+                if self.saved.get(key) != diff.version:
+                    sections[key] = self.encode_diff(diff)
+                    versions[key] = diff.version
+            for number, items in scene.levels.items.items():
+                key = (GROUND, name, number)
+                if self.saved.get(key) != items.version:
+                    sections[key] = self.encode_ground(items)
+                    versions[key] = items.version
+
+        player = scene_manager.player
+        if player is not None:
+            sections[(PLAYER, "", 0)] = self.encode_player(player)
+            sections[(INVENTORY, "", 0)] = self.encode_inventory(player.inventory)
+        sections[(GROWTH, "", 0)] = self.encode_growth(scene_manager.crystal_farm)
+        return sections, versions
+
+    def encode_diff(self, diff):
+        writer = Writer()
+        writer.pack("II", diff.width, len(diff.cells))
+        writer.data += diff.cells.tobytes()
+        writer.data += diff.tile_ids.tobytes()
+        return writer.bytes()
+
+    def encode_player(self, player):
+        writer = Writer()
+        held = -1 if player.held_item is None else player.held_item
+        writer.pack("ddBBhB", player.pos_x, player.pos_y, player.current_direction, player.holding, held,
+                    player.hotbar.active_slot)
+        return writer.bytes()
+
+    def encode_stack(self, writer, stack):
+        writer.string(stack.name)
+        writer.string(stack.kind.__name__)
+        writer.pack("Ii", stack.count, stack.price)
+        writer.image(stack.image)
+        writer.strings(stack.aspects)
+
+    def encode_inventory(self, inventory):
+        writer = Writer()
+        stacks = [(i, stack) for i, stack in enumerate(inventory.slots) if stack is not None]
+        writer.pack("I", len(stacks))
+        for i, stack in stacks:
+            writer.pack("H", i)
+            self.encode_stack(writer, stack)
+        return writer.bytes()
+
+    def encode_ground(self, world_items):
+        # Per item type: the stack fields once, then every position as two packed float32 arrays
+        writer = Writer()
+        count = world_items.count
+        types = world_items.by_type(np.arange(count))
+        writer.pack("I", len(types))
+        for type_id, indices in types.items():
+            self.encode_stack(writer, world_items.to_stack(type_id, len(indices)))
+            writer.data += world_items.x[indices].astype("<f4").tobytes()
+            writer.data += world_items.y[indices].astype("<f4").tobytes()
+        return writer.bytes()
+
+    def encode_growth(self, farm):
+        writer = Writer()
+        piles = [(pile, slot) for pile, slot in farm.slots.items()]
+        writer.pack("I", len(piles))
+        for pile, slot in piles:
+            writer.pack("iidddH", int(farm.x[slot]), int(farm.y[slot]), float(farm.progress[slot]),
+                        float(farm.speed[slot]), float(farm.max_growth[slot]), pile.product_quantity)
+            writer.string(pile.planted_object_type.__name__)
+            writer.pack("H", len(pile.images))
+            for image in pile.images:
+                writer.image(image)
+        return writer.bytes()
+
+    # Writing, background thread
+
+    def save(self, scene_manager):
+        # Returns the Future of the write, or None when the previous save is still running
+        if self.pending is not None and not self.pending.done():
+            print("Save skipped: the previous save is still being written")
+            return None
+        self.poll()
+        sections, versions = self.snapshot(scene_manager)
+        small = {key: data for key, data in sections.items() if key[0] not in (LEVEL, GROUND)}
+        previous = self.file
+        if previous is not None:
+            sections = {key: data for key, data in sections.items() if self.written.get(key) != data}
+        directory = dict(previous.sections) if previous is not None else {}
+        for key in sections:
+            directory.pop(key, None)
+        live = sum(length for _, length in directory.values()) + sum(map(len, sections.values()))
+        if previous is None or previous.size > live * self.compact_ratio + self.slack:
+            # Unchanged sections are copied out of the old mapping here, so it can be closed
+            kept = {key: bytes(previous.map[offset:offset + length]) for key, (offset, length) in directory.items()}
+            self.pending = self.executor.submit(self.rewrite, sections, kept)
+        else:
+            self.pending = self.executor.submit(self.append, sections, directory, live, previous.size)
+        # The file can't be replaced or truncated while it is mapped (Windows); poll() maps it again
+        self.replace_file(None)
+        self.pending.versions = versions
+        self.pending.small = small
+        return self.pending
+
+    def append(self, sections, directory, live, end):
+        with open(self.path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > end:
+                f.truncate(end)  # Leftovers of a torn append after the last good footer
+            f.seek(end)
+            for key, data in sections.items():
+                directory[key] = (f.tell(), len(data))
+                f.write(data)
+            self.write_directory(f, directory, live)
+
+    def rewrite(self, sections, kept):
+        # Fresh file with only live sections: kept ones from the old file, then the new ones
+        temp = self.path + ".tmp"
+        directory = {}
+        with open(temp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION))
+            for key, data in list(kept.items()) + list(sections.items()):
+                directory[key] = (f.tell(), len(data))
+                f.write(data)
+            live = sum(length for _, length in directory.values())
+            self.write_directory(f, directory, live)
+        os.replace(temp, self.path)
+
+    def write_directory(self, f, directory, live):
+        writer = Writer()
+        writer.pack("I", len(directory))
+        for (kind, scene, key), (offset, length) in directory.items():
+            writer.pack("B", kind)
+            writer.string(scene)
+            writer.data += ENTRY.pack(key, offset, length)
+        start = f.tell()
+        f.write(writer.bytes())
+        f.flush()
+        os.fsync(f.fileno())  # Sections and directory are on disk before the footer points at them
+        f.write(FOOTER.pack(END_MAGIC, start, live))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def poll(self):
+        # Main thread: once a write finishes, map the new file for later lazy reads
+        if self.pending is None or not self.pending.done():
+            return False
+        future, self.pending = self.pending, None
+        try:
+            future.result()
+        except OSError as e:
+            print(f"Error writing save {self.path}: {e}")
+            written = False  # The old file is still whole: appends only add after its footer
+        else:
+            self.saved.update(future.versions)
+            self.written = future.small
+            written = True
+        self.replace_file(open_save(self.path))
+        return written
+
+    def replace_file(self, save_file):
+        if self.file is not None:
+            self.file.close()
+        self.file = save_file
+
+    def wait(self):
+        if self.pending is not None:
+            self.pending.exception()  # Block until done; poll() reports errors
+            self.poll()
+
+    # Loading, main thread
+
+    def exists(self):
+        return self.pending is not None or os.path.exists(self.path)
+
+    def load(self, scene_manager):
+        # Restores the saved game and returns True; False when there is no usable save
+        self.wait()
+        save_file = open_save(self.path)
+        if save_file is None:
+            return False
+        self.replace_file(save_file)
+        self.saved = {}
+        self.written = {}
+
+        meta = save_file.reader(META)
+        current_name = meta.string()
+        scene_manager.crystal_farm.day = meta.unpack("I")
+        position = None
+        player_data = save_file.reader(PLAYER)
+        if player_data is not None:
+            position = player_data.unpack("dd")
+
+        for name, scene in self.cave_scenes(scene_manager):
+            reader = save_file.reader(SCENE, name)
+            if reader is None:
+                continue
+            world_seed, level = reader.unpack("QI")
+            scene.levels.source = lambda number, name=name: self.level_diff(name, number)
+            scene.levels.items_source = lambda number, name=name: self.ground_items(name, number)
+            scene.restore(world_seed, level, reader.strings(), position if name == current_name else None)
+
+        if current_name in scene_manager.scenes:
+            scene_manager.set_scene(current_name)
+        if scene_manager.player is not None:
+            self.load_player(scene_manager.player, save_file)
+        self.load_growth(scene_manager, save_file.reader(GROWTH))
+        return True
+
+    def level_diff(self, scene, number):
+        if self.pending is not None:
+            self.wait()  # The file is unmapped while a write is running
+        if self.file is None:
+            return None
+        diff = self.file.level_diff(scene, number)
+        if diff is not None:
+            self.saved[(LEVEL, scene, number)] = diff.version  # Already in the file until it changes
+        return diff
+
+    def ground_items(self, scene, number):
+        if self.pending is not None:
+            self.wait()
+        if self.file is None:
+            return None
+        reader = self.file.reader(GROUND, scene, number)
+        if reader is None:
+            return None
+        items = self.decode_ground(reader)
+        self.saved[(GROUND, scene, number)] = items.version
+        return items
+
+    def decode_stack(self, reader):
+        name = reader.string()
+        kind = ITEM_KINDS.get(reader.string(), Item)
+        count, price = reader.unpack("Ii")
+        image = reader.image()
+        return ItemStack(name, kind, image, count, reader.strings(), price)
+
+    def load_player(self, player, save_file):
+        reader = save_file.reader(PLAYER)
+        if reader is not None:
+            x, y, player.current_direction, holding, held, player.hotbar.active_slot = reader.unpack("ddBBhB")
+            player.place(x, y)
+            player.holding = bool(holding)
+            player.held_item = None if held < 0 else held
+        reader = save_file.reader(INVENTORY)
+        if reader is not None:
+            inventory = player.inventory
+            for i in range(len(inventory.slots)):
+                inventory.take_slot(i)
+            for _ in range(reader.unpack("I")):
+                i = reader.unpack("H")
+                stack = self.decode_stack(reader)
+                if i < len(inventory.slots):
+                    inventory.set_slot(i, stack)
+                else:
+                    inventory.add(stack)  # Saved from a bigger inventory
+
+    def decode_ground(self, reader):
+        world_items = WorldItems()
+        for _ in range(reader.unpack("I")):
+            stack = self.decode_stack(reader)
+            start = reader.offset
+            size = stack.count * 4
+            xs = np.frombuffer(reader.data[start:start + size], dtype="<f4")
+            ys = np.frombuffer(reader.data[start + size:start + 2 * size], dtype="<f4")
+            reader.offset += 2 * size
+            world_items.spawn_many(world_items.stack_type(stack), xs, ys)
+        return world_items
+
+    def load_growth(self, scene_manager, reader):
+        farm = scene_manager.crystal_farm
+        for pile in list(farm.slots):
+            farm.remove(pile)
+            pile.kill()
+        if reader is None:
+            return
+        for _ in range(reader.unpack("I")):
+            x, y, progress, speed, max_growth, quantity = reader.unpack("iidddH")
+            kind = ITEM_KINDS.get(reader.string(), Crystal)
+            images = [reader.image() for _ in range(reader.unpack("H"))]
+            pile = CrystalPile(x, y, images, kind, speed, quantity, max_growth)
+            pile.set_stage(min(visible_stage(progress), len(images) - 1))
+            slot = farm.add(pile)
+            farm.progress[slot] = progress
+            scene_manager.all_sprites.add(pile)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)  # Let a running save finish
+        self.poll()
+        self.replace_file(None)
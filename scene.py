@@ -1,24 +1,58 @@
+from events import EventBus
+from growth import CrystalFarm
 from player import Player
+from profiler import FrameProfiler, ProfilerOverlay
+from render import RenderPipeline
+from savegame import SaveManager
 from settings import *
+from spatial import IndexedGroup
+from ui import text_cache
 
 class SceneManager:
     def __init__(self, screen):
         self.screen = screen
         self.scenes = {}
+        self.factories = {}  # scene name -> (factory, manifest) for scenes built once their images are in
         self.current_scene = None
+        self.loading = LoadingScene(self)  # Shown while a scene's images stream in
         self.player = None
-        self.all_sprites = pygame.sprite.Group() # Manage all sprites centrally
-        self.crystal_group = pygame.sprite.Group() # Group for crystals
+        self.all_sprites = IndexedGroup(256) # Manage all sprites centrally, coarse cells for view culling
+        self.crystal_farm = CrystalFarm() # Grows every planted CrystalPile in one step per day
+        self.pipeline = RenderPipeline(screen)
+        self.profiler = FrameProfiler()
+        self.overlay = ProfilerOverlay(self.profiler)  # Toggled with F3, F4 exports the trace
+        self.saves = SaveManager(SAVE_PATH)  # F5 saves, MenuScene's Continue loads
+        self.save_timer = 0.0
+        self.events = EventBus()  # Scenes, the player and widgets subscribe here instead of polling every event
+        self.events.subscribe_key(pygame.KEYDOWN, pygame.K_F3, self.toggle_overlay)
+        self.events.subscribe_key(pygame.KEYDOWN, pygame.K_F4, lambda event: self.profiler.export(TRACE_PATH))
+        self.events.subscribe_key(pygame.KEYDOWN, pygame.K_F5, lambda event: self.save_game())
+
+    @property
+    def world_items(self):
+        # Dropped items on the level being played, None in scenes without levels
+        return getattr(self.current_scene, "world_items", None)
 
     def add_scene(self, scene_name, scene):
         self.scenes[scene_name] = scene
 
-    def set_scene(self, scene_name):
-        if scene_name in self.scenes:
-            if self.current_scene:
-                self.current_scene.on_exit()
+    def add_lazy_scene(self, scene_name, factory, manifest=()):
+        # The scene is built by factory() the first time it is set, after its images are decoded
+        self.factories[scene_name] = (factory, list(manifest))
+
+    def switch_to(self, scene):
+        if self.current_scene:
+            self.current_scene.on_exit()
+
+        self.current_scene = scene
+        self.events.set_scope(scene) # Only this scene's subscriptions stay active
+        self.pipeline.reset() # New scene, repaint the whole screen once
 
-            self.current_scene = self.scenes[scene_name]
+    def set_scene(self, scene_name):
+        if scene_name in self.factories:
+            self.load_scenes([scene_name], lambda: self.set_scene(scene_name))
+        elif scene_name in self.scenes:
+            self.switch_to(self.scenes[scene_name])
             if self.player:
                 self.current_scene.on_enter(self.player)
             else:
@@ -28,23 +62,96 @@ class SceneManager:
         else:
             print(f"Error: Scene '{scene_name}' not found.")
 
+    def load_scenes(self, names, then):
+        # Streams the scenes' images behind the loading scene, builds the scenes, then calls then()
+        manifest = [name for scene_name in names for name in self.factories[scene_name][1]]
+        batch = assets.stream(manifest)
+
+        def done():
+            for scene_name in names:
+                if scene_name in self.factories:
+                    factory, _ = self.factories.pop(scene_name)
+                    self.scenes[scene_name] = factory()
+            then()
+
+        if batch.finished():
+            done()  # Everything was already loaded, skip the loading screen
+        else:
+            self.loading.start(batch, done)
+            self.switch_to(self.loading)
+
     def update(self, dt):
+        assets.poll() # Finish images decoded in the background, a couple of milliseconds at most
         if self.current_scene:
-            self.current_scene.update(dt)
-            self.all_sprites.update() # Update all sprites
-
-    def draw(self):
+            self.current_scene.update(dt) # The scene updates its own sprites, exactly once
+        self.saves.poll()
+        if AUTOSAVE_INTERVAL and self.player:
+            self.save_timer += dt
+            if self.save_timer >= AUTOSAVE_INTERVAL:
+                self.save_game()
+
+    def save_game(self):
+        # Snapshot now, write in the background
+        self.save_timer = 0.0
+        return self.saves.save(self)
+
+    def load_game(self):
+        if self.factories:
+            # The saved scenes have to exist before they can be restored
+            if not self.saves.exists():
+                return False
+            self.load_scenes(list(self.factories), self.finish_loading_game)
+            return True
+        return self.saves.load(self)
+
+    def finish_loading_game(self):
+        if not self.load_game():
+            print("Error: Could not load the save")
+            self.set_scene("menu")
+
+    def simulate(self, ticks, step=1 / 60):
+        # Run fixed ticks back to back without rendering, faster than real time
+        for _ in range(ticks):
+            self.update(step)
+
+    def draw(self, alpha=1.0):
+        # Returns the screen rects that changed, for pygame.display.update
+        rects = []
         if self.current_scene:
-            self.current_scene.draw(self.screen)
-            self.all_sprites.draw(self.screen) # Draw all sprites
+            rects = self.pipeline.render(self.current_scene, alpha)
+        if self.overlay.visible:
+            rects.append(self.overlay.draw(self.screen))
+        return rects
+
+    def next_day(self):
+        # Returns the piles whose image changed
+        return self.crystal_farm.advance_day()
+
+    def sprite_counts(self):
+        world_items = self.world_items
+        return {"all_sprites": len(self.all_sprites), "world_items": len(world_items) if world_items is not None else 0}
+
+    def toggle_overlay(self, event):
+        self.overlay.toggle()
+        self.pipeline.invalidate() # Repaint what the overlay covered
 
     def handle_input(self, event):
-        if self.current_scene:
-            self.current_scene.handle_input(event)
+        return self.events.dispatch(event)
+
+    def shutdown(self, save=True):
+        # Save on the way out, then stop background workers owned by scenes
+        if save and self.player:
+            self.save_game()
+        self.saves.shutdown()
+        assets.shutdown()
+        for scene in self.scenes.values():
+            if hasattr(scene, "shutdown"):
+                scene.shutdown()
 
     def create_player(self, scene_name):
         self.player = Player(self, self.scenes[scene_name])
         self.all_sprites.add(self.player) # Add to central sprite group
+        self.current_scene.on_enter(self.player)
 
 
 #Example Scene Class
@@ -55,15 +162,62 @@ class Scene:
     def on_enter(self):
         pass #Initialize scene elements
 
+    def on_exit(self):
+        pass
+
     def update(self,dt):
         pass  #Game logic for the scene
 
+    def collect_dirty(self, pipeline):
+        pipeline.invalidate() #Report changed areas; by default the whole screen is redrawn
+
+    def draw_layer(self, layer, screen):
+        if layer == "tiles":
+            self.draw(screen) #Scenes without layers draw everything once
+
     def draw(self, screen):
         pass #Draw scene elements
 
-    def handle_input(self, event):
-        pass #Handle inputs for the scene
-
     def entrance_coords(self):
         # Set player starting position
-        return (100, 100)
\ No newline at end of file
+        return (100, 100)
+
+
+class LoadingScene(Scene):
+    # A label and a progress bar, drawn while SceneManager streams in another scene's images
+    def __init__(self, scene_manager):
+        super().__init__()
+        self.scene_manager = scene_manager
+        self.batch = None
+        self.then = None  # Called once, when the batch has finished
+        self.label = text_cache.render("Loading...", 36, (255, 255, 255))
+        self.bar = pygame.Rect(0, 0, 400, 24)
+        self.bar.center = scene_manager.screen.get_rect().center
+
+    def start(self, batch, then):
+        self.batch = batch
+        self.then = then
+
+    def on_enter(self, player=None):
+        pass
+
+    def update(self, dt):
+        if self.then and self.batch.finished():
+            then, self.then = self.then, None
+            then()
+
+    def collect_dirty(self, pipeline):
+        # Only the bar changes, and only when another image has come in
+        pipeline.track(self, self.bar, self.batch.loaded() if self.batch else 0)
+
+    def draw_layer(self, layer, screen):
+        if layer == "tiles":
+            screen.fill((0, 0, 0))
+        elif layer == "ui":
+            screen.blit(self.label, self.label.get_rect(center=(screen.get_width() // 2, self.bar.top - 40)))
+            pygame.draw.rect(screen, (255, 255, 255), self.bar, 2)
+            progress = self.batch.progress() if self.batch else 0.0
+            filled = self.bar.inflate(-8, -8)
+            filled.width = round(filled.width * progress)
+            if filled.width:
+                screen.fill((255, 255, 255), filled)
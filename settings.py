@@ -1,9 +1,40 @@
 import pygame
 
-def loadim(image):
-    try:
-        return pygame.image.load(f'images/{image}').convert_alpha() # convert_alpha for transparency
-    except pygame.error as e:
-        print(f"Error loading image {image}: {e}")
-        return None # Return None to handle missing images gracefully
+from assets import AssetManager
+
+TILE_SIZE = 32
+
+SIMULATION_RATE = 60  # Fixed game ticks per second
+MAX_CATCH_UP_STEPS = 5  # Ticks run at most per rendered frame before falling behind
+FRAME_RATE_LIMIT = 60  # Render frame cap, 0 for uncapped
+
+SAVE_PATH = "savegame.bin"
+TRACE_PATH = "frame_trace.csv"  # F4 writes the profiler's buffered frames here
+AUTOSAVE_INTERVAL = 120  # Seconds of game time between background saves, 0 to disable
 
+# Streamed in before the scenes that use them (see SceneManager.add_lazy_scene), the
+# world's images in the background while the menu is up
+MENU_ASSETS = [
+    "Фон меню.png",
+]
+WORLD_ASSETS = [
+    "Map/rамень.png",
+    "Map/земля.png",
+    "farmer-big.png",
+    "inventory.png",
+    "items.png",
+    "tools.png",
+    "Хотбар. Увелич обводка.png",
+    "crystal.png",
+]
+ASSET_MANIFEST = MENU_ASSETS + WORLD_ASSETS  # Everything, for synchronous preloading (bench.py)
+
+# Packed into shared atlases at startup so world sprites can be blitted in batches
+ATLAS_DIRECTORY = "спрайты"
+ATLAS_SHEETS = ["items.png", "tools.png"]
+
+assets = AssetManager("images")
+
+def loadim(image):
+    # Cached; missing images come back as the shared assets.placeholder surface
+    return assets.get(image)
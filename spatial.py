@@ -0,0 +1,99 @@
+import pygame
+
+
+class SpatialHash:
+    # Uniform grid of sprites keyed by the cell under each sprite's rect.center.
+    # With cell_size equal to the tile size, cell coordinates are tile coordinates.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}  # (cell_x, cell_y) -> set of sprites
+        self.keys = {}  # sprite -> cell it is filed under
+
+    def key(self, pos):
+        return (int(pos[0]) // self.cell_size, int(pos[1]) // self.cell_size)
+
+    def insert(self, sprite):
+        key = self.key(sprite.rect.center)
+        self.keys[sprite] = key
+        self.cells.setdefault(key, set()).add(sprite)
+
+    def remove(self, sprite):
+        key = self.keys.pop(sprite, None)
+        if key is None:
+            return
+        cell = self.cells[key]
+        cell.discard(sprite)
+        if not cell:
+            del self.cells[key]
+
+    def move(self, sprite):
+        # Re-file a sprite after its rect changed; a no-op while it stays in the same cell
+        key = self.key(sprite.rect.center)
+        if self.keys.get(sprite) != key:
+            self.remove(sprite)
+            self.keys[sprite] = key
+            self.cells.setdefault(key, set()).add(sprite)
+
+    def at(self, cell_x, cell_y):
+        return self.cells.get((cell_x, cell_y), ())
+
+    def first_at(self, cell_x, cell_y, kind=None):
+        for sprite in self.at(cell_x, cell_y):
+            if kind is None or isinstance(sprite, kind):
+                return sprite
+        return None
+
+    def within(self, pos, radius):
+        # Sprites whose rect.center lies within radius pixels of pos
+        x, y = pos
+        radius_sq = radius * radius
+        cx0, cy0 = self.key((x - radius, y - radius))
+        cx1, cy1 = self.key((x + radius, y + radius))
+        found = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                for sprite in self.cells.get((cx, cy), ()):
+                    sx, sy = sprite.rect.center
+                    if (sx - x) ** 2 + (sy - y) ** 2 <= radius_sq:
+                        found.append(sprite)
+        return found
+
+    def query_rect(self, rect, margin=0):
+        # Sprites whose rect overlaps rect. margin widens the cell search for sprites
+        # larger than a cell, whose centre may sit outside the queried area.
+        cx0, cy0 = self.key((rect.left - margin, rect.top - margin))
+        cx1, cy1 = self.key((rect.right + margin, rect.bottom + margin))
+        found = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                for sprite in self.cells.get((cx, cy), ()):
+                    if rect.colliderect(sprite.rect):
+                        found.append(sprite)
+        return found
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class IndexedGroup(pygame.sprite.Group):
+    # Sprite group that keeps a SpatialHash in sync with its membership
+    def __init__(self, cell_size, *sprites):
+        self.index = SpatialHash(cell_size)
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.index.insert(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.index.remove(sprite)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        for sprite in self.sprites():
+            self.index.move(sprite)
+
+    def reindex(self, sprite):
+        # Call after moving a sprite outside of update()
+        self.index.move(sprite)
@@ -0,0 +1,37 @@
+import pytest
+
+from growth import CrystalFarm
+
+
+class Pile:
+    def __init__(self, speed, max_growth=3):
+        self.growth_stage = 0
+        self.growth_speed = speed
+        self.max_growth = max_growth
+        self.rect = type("Rect", (), {"topleft": (0, 0)})()
+        self.stages = []
+
+    def set_stage(self, stage):
+        self.growth_stage = stage
+        self.stages.append(stage)
+
+
+@pytest.mark.parametrize("speed, days, stage", [(0.1, 10, 1), (0.3, 10, 3), (1 / 3, 6, 2), (0.7, 3, 2)])
+def test_stage_changes_on_the_day_it_is_reached(speed, days, stage):
+    farm = CrystalFarm()
+    pile = Pile(speed)
+    farm.add(pile)
+    for _ in range(days):
+        farm.advance_day()
+    assert pile.growth_stage == stage
+
+
+def test_ripe_once_full_grown():
+    farm = CrystalFarm()
+    pile = Pile(0.1, max_growth=1)
+    farm.add(pile)
+    for _ in range(9):
+        farm.advance_day()
+    assert farm.ripe() == []
+    farm.advance_day()
+    assert farm.ripe() == [pile]
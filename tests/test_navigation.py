@@ -0,0 +1,41 @@
+import numpy as np
+
+from collision import PassabilityMap
+from navigation import NavGrid
+
+SOLID = bytearray(256)
+SOLID[1] = 1
+
+
+def corridor():
+    # Open row y=1 from x=1 to x=15, walls everywhere else; region size 16
+    grid = np.ones((3, 32), dtype=np.uint8)
+    grid[1, 1:16] = 0
+    passability = PassabilityMap(grid, SOLID)
+    return passability, NavGrid(passability, region_size=16)
+
+
+def mine(passability, navigation, x, y):
+    passability.update(x, y, 0)
+    navigation.tile_changed(x, y)
+
+
+def test_mining_the_wall_a_field_stopped_at_rebuilds_it():
+    passability, navigation = corridor()
+    field = navigation.flow_field((1, 1))
+    assert field.distance(17, 1) == float("inf")
+    mine(passability, navigation, 16, 1)
+    mine(passability, navigation, 17, 1)
+    rebuilt = navigation.flow_field((1, 1))
+    assert rebuilt is not field
+    assert rebuilt.distance(17, 1) == 16
+    assert rebuilt.next_tile(17, 1) == (16, 1)
+
+
+def test_path_cache_follows_mined_walls():
+    passability, navigation = corridor()
+    assert navigation.find_path((1, 1), (20, 1)) is None
+    for x in range(16, 21):
+        mine(passability, navigation, x, 1)
+    path = navigation.find_path((1, 1), (20, 1))
+    assert path[0] == (1, 1) and path[-1] == (20, 1) and len(path) == 20
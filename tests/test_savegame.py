@@ -0,0 +1,83 @@
+import shutil
+from types import SimpleNamespace
+
+import pygame
+
+from Object import Crystal
+from entities import WorldItems
+from growth import CrystalFarm
+from savegame import GROUND, META, PLAYER, SaveManager, open_save
+
+
+def save(manager, player):
+    # Runs the real save path with a fixed snapshot instead of a whole game
+    manager.snapshot = lambda scene_manager: ({(META, "", 0): b"meta", (PLAYER, "", 0): bytes([player]) * 8}, {})
+    manager.save(None).result()
+    manager.poll()
+
+
+def player_bytes(path):
+    save_file = open_save(path)
+    try:
+        return bytes(save_file.section(PLAYER))
+    finally:
+        save_file.close()
+
+
+def test_torn_append_falls_back_to_previous_save(tmp_path):
+    path = str(tmp_path / "game.sav")
+    manager = SaveManager(path)
+    save(manager, 1)
+    save(manager, 2)
+    good = tmp_path / "good.sav"
+    shutil.copy(path, good)
+    good_size = good.stat().st_size
+    save(manager, 3)  # Appended after save 2's footer
+    manager.shutdown()
+    full = (tmp_path / "game.sav").read_bytes()
+    assert len(full) > good_size
+
+    for cut in sorted({good_size + 1, good_size + 8, (good_size + len(full)) // 2, len(full) - 12, len(full) - 1}):
+        (tmp_path / "game.sav").write_bytes(full[:cut])
+        assert player_bytes(path) == bytes([2]) * 8
+
+        # Saving again over the torn tail keeps the file loadable
+        manager = SaveManager(path)
+        manager.replace_file(open_save(path))
+        save(manager, 4)
+        assert player_bytes(path) == bytes([4]) * 8
+        save(manager, 5)
+        assert player_bytes(path) == bytes([5]) * 8
+        manager.shutdown()
+
+
+def test_compaction_unmaps_the_old_file(tmp_path):
+    path = str(tmp_path / "game.sav")
+    manager = SaveManager(path, compact_ratio=1.0, slack=0)  # Every save after the first rewrites
+    save(manager, 1)
+    manager.snapshot = lambda scene_manager: ({(PLAYER, "", 0): b"\x02" * 8}, {})
+    future = manager.save(None)
+    assert manager.file is None  # Closed before the background rewrite replaces the file
+    future.result()
+    manager.poll()
+    assert manager.file is not None
+    assert bytes(manager.file.section(META)) == b"meta"  # Copied over from the old file
+    assert bytes(manager.file.section(PLAYER)) == b"\x02" * 8
+    manager.shutdown()
+
+
+def test_unchanged_ground_items_are_not_encoded_again(tmp_path):
+    items = WorldItems()
+    levels = SimpleNamespace(diffs={}, items={1: items})
+    cave = SimpleNamespace(world_seed=7, current_level=1, tiles=SimpleNamespace(names=[]), levels=levels)
+    game = SimpleNamespace(scenes={"cave": cave}, current_scene=cave, crystal_farm=CrystalFarm(), player=None)
+    manager = SaveManager(str(tmp_path / "game.sav"))
+    manager.save(game).result()
+    manager.poll()
+    sections, versions = manager.snapshot(game)
+    assert (GROUND, "cave", 1) not in sections
+
+    items.spawn(items.item_type(Crystal, "Crystal", pygame.Surface((4, 4))), 10, 20)
+    sections, versions = manager.snapshot(game)
+    assert versions[(GROUND, "cave", 1)] == items.version
+    manager.shutdown()
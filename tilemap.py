@@ -0,0 +1,193 @@
+from array import array
+
+
+class TileRegistry:
+    # Maps compact integer tile IDs to tile names and images
+    DEFAULT_TILES = ("grass", "wall", "cobblestone", "plantable")
+    DEFAULT_SOLID = ("wall", "cobblestone")
+
+    def __init__(self, tile_images=None, names=DEFAULT_TILES, solid=DEFAULT_SOLID):
+        self.names = []
+        self.ids = {}
+        self.images = []
+        self.solid = bytearray(256)  # tile ID -> 1 if it blocks movement, a lookup table for collision
+        for name in names:
+            self.register(name)
+        for name, image in (tile_images or {}).items():
+            self.register(name, image)
+        for name in solid:
+            self.set_solid(name)
+
+    def register(self, name, image=None):
+        if name in self.ids:
+            tile_id = self.ids[name]
+            if image is not None:
+                self.images[tile_id] = image
+            return tile_id
+        if len(self.names) >= 256:
+            raise ValueError("TileRegistry supports at most 256 tile types")
+        tile_id = len(self.names)
+        self.names.append(name)
+        self.images.append(image)
+        self.ids[name] = tile_id
+        return tile_id
+
+    def id(self, name):
+        return self.ids[name]
+
+    def set_solid(self, name, solid=True):
+        self.solid[self.register(name)] = solid
+
+    def is_solid(self, tile_id):
+        return bool(self.solid[tile_id])
+
+    def name(self, tile_id):
+        return self.names[tile_id]
+
+    def image(self, tile_id):
+        return self.images[tile_id]
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __len__(self):
+        return len(self.names)
+
+
+class TileMap:
+    # Row-major grid of tile IDs in one contiguous byte array
+    def __init__(self, width, height, fill=0):
+        self.width = width
+        self.height = height
+        self.tiles = array("B", bytes([fill])) * (width * height)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x, y):
+        return self.tiles[y * self.width + x]
+
+    def set(self, x, y, tile_id):
+        self.tiles[y * self.width + x] = tile_id
+
+    def row(self, y):
+        start = y * self.width
+        return self.tiles[start:start + self.width]
+
+    def clip(self, x, y, width, height):
+        # Clamp a rectangle to the map, returns (x0, y0, x1, y1) with exclusive ends
+        return max(x, 0), max(y, 0), min(x + width, self.width), min(y + height, self.height)
+
+    def fill(self, tile_id, x=0, y=0, width=None, height=None):
+        x0, y0, x1, y1 = self.clip(x, y, self.width if width is None else width,
+                                   self.height if height is None else height)
+        if x0 >= x1:
+            return
+        span = array("B", bytes([tile_id])) * (x1 - x0)
+        for row in range(y0, y1):
+            start = row * self.width + x0
+            self.tiles[start:start + (x1 - x0)] = span
+
+    def border(self, tile_id):
+        self.fill(tile_id, 0, 0, self.width, 1)
+        self.fill(tile_id, 0, self.height - 1, self.width, 1)
+        self.fill(tile_id, 0, 0, 1, self.height)
+        self.fill(tile_id, self.width - 1, 0, 1, self.height)
+
+    def region(self, x, y, width, height):
+        # Copy of a rectangular area as a new TileMap
+        x0, y0, x1, y1 = self.clip(x, y, width, height)
+        result = TileMap(max(x1 - x0, 0), max(y1 - y0, 0))
+        for row in range(y0, y1):
+            start = row * self.width + x0
+            dest = (row - y0) * result.width
+            result.tiles[dest:dest + result.width] = self.tiles[start:start + result.width]
+        return result
+
+    def count(self, tile_id, x=0, y=0, width=None, height=None):
+        x0, y0, x1, y1 = self.clip(x, y, self.width if width is None else width,
+                                   self.height if height is None else height)
+        total = 0
+        for row in range(y0, y1):
+            start = row * self.width
+            total += self.tiles[start + x0:start + x1].count(tile_id)
+        return total
+
+    def positions(self, tile_id):
+        # All (x, y) cells holding tile_id
+        width = self.width
+        return [(i % width, i // width) for i, tile in enumerate(self.tiles) if tile == tile_id]
+
+
+class ChunkedTileMap:
+    # Large tile map split into square TileMap chunks that are created on first access.
+    # With a generator, chunks far from the player can be unloaded and regenerated later.
+    def __init__(self, width, height, chunk_size=32, fill=0, generator=None):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.fill_tile = fill
+        self.generator = generator  # generator(chunk, cx, cy) fills a fresh chunk
+        self.on_load = None  # on_load(cx, cy, chunk) after a chunk is generated, e.g. to replay player edits
+        self.chunks = {}
+        self.chunks_x = (width + chunk_size - 1) // chunk_size
+        self.chunks_y = (height + chunk_size - 1) // chunk_size
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def has_chunk(self, cx, cy):
+        return (cx, cy) in self.chunks
+
+    def chunk(self, cx, cy):
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            # Edge chunks are trimmed to the map size
+            width = min(self.chunk_size, self.width - cx * self.chunk_size)
+            height = min(self.chunk_size, self.height - cy * self.chunk_size)
+            chunk = TileMap(width, height, self.fill_tile)
+            if self.generator:
+                self.generator(chunk, cx, cy)
+            self.chunks[(cx, cy)] = chunk
+            if self.on_load:
+                self.on_load(cx, cy, chunk)
+        return chunk
+
+    def get(self, x, y):
+        size = self.chunk_size
+        return self.chunk(x // size, y // size).get(x % size, y % size)
+
+    def set(self, x, y, tile_id):
+        size = self.chunk_size
+        self.chunk(x // size, y // size).set(x % size, y % size, tile_id)
+
+    def chunk_range(self, x0, y0, x1, y1):
+        # Chunk coordinates overlapping the tile rectangle [x0, x1) x [y0, y1)
+        size = self.chunk_size
+        cx0 = max(x0 // size, 0)
+        cy0 = max(y0 // size, 0)
+        cx1 = min((x1 - 1) // size, self.chunks_x - 1)
+        cy1 = min((y1 - 1) // size, self.chunks_y - 1)
+        return [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]
+
+    def unload(self, cx, cy):
+        self.chunks.pop((cx, cy), None)
+
+    def generate_area(self, x0, y0, x1, y1):
+        # Makes sure every chunk overlapping the tile rectangle exists
+        for cx, cy in self.chunk_range(x0, y0, x1, y1):
+            self.chunk(cx, cy)
+
+    def unload_outside(self, keep):
+        # Drops chunks not in keep; only generated maps can, the rest has nothing to rebuild from
+        if self.generator is None:
+            return []
+        far = [key for key in self.chunks if key not in keep]
+        for cx, cy in far:
+            self.unload(cx, cy)
+        return far
+
+    def generate_all(self):
+        for cy in range(self.chunks_y):
+            for cx in range(self.chunks_x):
+                self.chunk(cx, cy)
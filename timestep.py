@@ -0,0 +1,25 @@
+class FixedTimestep:
+    # Turns variable frame times into a whole number of fixed simulation ticks.
+    # Leftover time carries over; alpha says how far rendering is between two ticks.
+    def __init__(self, step=1 / 60, max_steps=5):
+        self.step = step
+        self.max_steps = max_steps  # Bound on catch-up ticks after a long frame
+        self.accumulator = 0.0
+
+    def advance(self, frame_dt):
+        self.accumulator += frame_dt
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            # Too far behind, drop the backlog instead of spiralling
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.step, 1.0)
+
+    def reset(self):
+        self.accumulator = 0.0
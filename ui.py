@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:
+    # Fonts keyed by (name, size) and rendered text keyed by (text, font, color), so
+    # labels are rendered once and every widget shares the same Font objects
+    def __init__(self, limit=512):
+        self.limit = limit  # Rendered surfaces kept; least recently used ones are dropped
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def font(self, name=None, size=36):
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = self.fonts[key] = pygame.font.Font(name, size)
+        return font
+
+    def render(self, text, size=36, color=(255, 255, 255), name=None):
+        key = (text, name, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = self.font(name, size).render(text, True, color)
+            if len(self.surfaces) > self.limit:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+text_cache = TextCache()  # Shared by every scene and widget
+
+_UNBUILT = object()
+
+
+class CachedSurface:
+    # A widget's composed image. get() only repaints it when the widget's state value
+    # changes, otherwise the same surface is blitted again.
+    def __init__(self, size):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()  # Matches the screen format for faster blits
+        self.state = _UNBUILT
+        self.rebuilds = 0
+
+    def get(self, state, compose):
+        if state != self.state:
+            self.surface.fill((0, 0, 0, 0))
+            compose(self.surface)
+            self.state = state
+            self.rebuilds += 1
+        return self.surface
+
+    def invalidate(self):
+        self.state = _UNBUILT